@@ -0,0 +1,99 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+
+# Manifest-driven asset loader. Files are decoded on a thread pool; the display-format
+# conversion has to happen on the main thread, so it is done when an asset is first used
+# (or by poll() while a loading screen is up). Entries found in a compiled AssetBundle
+# (bundle.py) are built from its raw buffers instead of being decoded.
+#
+# Manifest entries: name -> {"path": file in base_dir, "kind": "image" | "sound",
+#                            "size": (w, h) to scale to, "alpha": False for opaque images,
+#                            "preload": False to decode only on first use}
+class AssetManager:
+    def __init__(self, base_dir, manifest, workers=4, bundle=None):
+        self.base_dir = base_dir
+        self.manifest = manifest
+        self.bundle = bundle
+        self.workers = workers
+        self.executor = None
+        self.assets = {}
+        self.pending = {}
+        self.preloads = []
+        self.decode_ms = {}
+        self.lazy_loads = 0
+        self.bundled = 0
+        self.created = time.perf_counter()
+        self.marks = {}
+
+    def _decode(self, name):
+        entry = self.manifest[name]
+        start = time.perf_counter()
+        path = os.path.join(self.base_dir, entry["path"])
+        if self.bundle is not None and name in self.bundle:
+            asset = self.bundle.load(name)
+            self.bundled += 1
+        elif entry.get("kind", "image") == "sound":
+            asset = pygame.mixer.Sound(path)
+        else:
+            asset = pygame.image.load(path)
+            if "size" in entry:
+                asset = pygame.transform.scale(asset, entry["size"])
+        self.decode_ms[name] = (time.perf_counter() - start) * 1000
+        return asset
+
+    def preload(self):
+        # Starts decoding every preload entry in the background and returns immediately
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="assets")
+        for name, entry in self.manifest.items():
+            if entry.get("preload", True) and name not in self.assets and name not in self.pending:
+                self.pending[name] = self.executor.submit(self._decode, name)
+                self.preloads.append(name)
+
+    def _finish(self, name):
+        future = self.pending.pop(name, None)
+        if future is None:
+            self.lazy_loads += 1
+            asset = self._decode(name)
+        else:
+            asset = future.result()
+        entry = self.manifest[name]
+        if entry.get("kind", "image") == "image":
+            asset = asset.convert_alpha() if entry.get("alpha", True) else asset.convert()
+        self.assets[name] = asset
+        if not self.pending and self.preloads and "preloaded" not in self.marks:
+            self.mark("preloaded")
+        return asset
+
+    def get(self, name):
+        # Blocks on the background decode if it has not finished yet
+        asset = self.assets.get(name)
+        if asset is None:
+            asset = self._finish(name)
+        return asset
+
+    def poll(self):
+        # Converts whatever finished decoding; returns (loaded, total) preload counts
+        for name in [name for name, future in self.pending.items() if future.done()]:
+            self._finish(name)
+        return len(self.preloads) - len(self.pending), len(self.preloads)
+
+    def ready(self):
+        return not self.pending
+
+    def mark(self, name):
+        # Records a startup milestone in milliseconds since the manager was created
+        self.marks[name] = (time.perf_counter() - self.created) * 1000
+
+    def stats(self):
+        return {
+            "marks_ms": dict(self.marks),
+            "decode_ms": dict(self.decode_ms),
+            "preloaded": len(self.preloads),
+            "lazy_loads": self.lazy_loads,
+            "bundled": self.bundled,
+        }
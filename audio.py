@@ -0,0 +1,72 @@
+import time
+
+import pygame
+
+
+# Sound effects played on mixer channels reserved per group, so a burst of one kind of sound
+# (shots, explosions) can never take the channels another group needs. Within a group a sound
+# plays on an idle channel, or steals the lowest priority, oldest voice if that is not above its
+# own priority; otherwise it is dropped. min_interval rate-limits how often a sound may start.
+# Music streams through pygame.mixer.music and only shares the master volume.
+#
+# groups: name -> {"channels": count, "volume": group volume}
+# sounds: asset name -> {"group": name, "priority": higher wins, "min_interval": seconds}
+class AudioManager:
+    def __init__(self, assets, groups, sounds, clock=time.perf_counter):
+        self.assets = assets
+        self.sounds = sounds
+        self.clock = clock
+        self.volume = 1.0
+        # Volume last pushed to each sound; sounds pick up a new volume when they next play
+        self.applied = {}
+        self.group_volume = {name: group.get("volume", 1.0) for name, group in groups.items()}
+        total = sum(group["channels"] for group in groups.values())
+        if pygame.mixer.get_num_channels() < total:
+            pygame.mixer.set_num_channels(total)
+        # Plain Sound.play() calls (if any remain) can only pick channels past the reserved ones
+        pygame.mixer.set_reserved(total)
+        self.channels = {}
+        start = 0
+        for name, group in groups.items():
+            self.channels[name] = [pygame.mixer.Channel(i) for i in range(start, start + group["channels"])]
+            start += group["channels"]
+        # Per channel: (priority, start time) of what it last played
+        self.voices = {}
+        self.last_played = {}
+        self.played = 0
+        self.dropped = 0
+        self.stolen = 0
+
+    def play(self, name):
+        settings = self.sounds[name]
+        now = self.clock()
+        if now - self.last_played.get(name, -1e9) < settings.get("min_interval", 0):
+            self.dropped += 1
+            return None
+        priority = settings.get("priority", 0)
+        channels = self.channels[settings["group"]]
+        channel = next((channel for channel in channels if not channel.get_busy()), None)
+        if channel is None:
+            channel = min(channels, key=lambda channel: self.voices.get(channel, (0, 0)))
+            if self.voices.get(channel, (0, 0))[0] > priority:
+                self.dropped += 1
+                return None
+            self.stolen += 1
+        sound = self.assets.get(name)
+        if self.applied.get(name) != self.volume:
+            sound.set_volume(self.volume * self.group_volume[settings["group"]])
+            self.applied[name] = self.volume
+        channel.play(sound)
+        self.voices[channel] = (priority, now)
+        self.last_played[name] = now
+        self.played += 1
+        return channel
+
+    def set_volume(self, volume):
+        # Master volume; the music stream is updated at once, only when the value moved
+        if volume != self.volume:
+            self.volume = volume
+            pygame.mixer.music.set_volume(volume)
+
+    def stats(self):
+        return {"played": self.played, "dropped": self.dropped, "stolen": self.stolen}
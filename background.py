@@ -0,0 +1,75 @@
+import math
+
+import pygame
+
+# Layers below this brightness are made transparent when keyed, leaving just the stars
+STAR_KEY_THRESHOLD = 64
+
+
+def key_dark_pixels(image, threshold=STAR_KEY_THRESHOLD):
+    # Opaque copy where every pixel darker than threshold (brightest channel) is the colorkey;
+    # RLE-accelerated, so blitting a sparse star layer only copies the stars
+    keyed = image.convert()
+    pixels = pygame.surfarray.pixels3d(keyed)
+    pixels[pixels.max(axis=2) < threshold] = 0
+    del pixels
+    keyed.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+    return keyed
+
+
+# One parallax layer: the image tiled vertically into a strip one screen taller than the tile,
+# so any scroll offset is a single screen-sized window into the strip. Images that do not tile
+# seamlessly can repeat as the image followed by its mirror (mirror=True). Windows are blitted with an area rect rather than as
+# subsurfaces, which would lose the RLE acceleration of keyed layers.
+class BackgroundLayer:
+    def __init__(self, image, size, speed=1.0, keyed=False, mirror=False):
+        width, height = size
+        if image.get_size() != size:
+            image = pygame.transform.smoothscale(image.convert(), size)
+        if keyed:
+            image = key_dark_pixels(image)
+        tiles = [image, pygame.transform.flip(image, False, True)] if mirror else [image]
+        self.tile_height = height * len(tiles)
+        self.strip = pygame.Surface((width, self.tile_height + height)).convert()
+        for i in range(len(tiles) + 1):
+            self.strip.blit(tiles[i % len(tiles)], (0, i * height))
+        if keyed:
+            self.strip.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+        self.size = size
+        self.speed = speed
+        self.keyed = keyed
+
+    def offset(self, scroll):
+        return int(scroll * self.speed) % self.tile_height
+
+    def area(self, scroll):
+        # Same picture as blitting the tile at (0, offset) and (0, offset - tile height)
+        return (0, self.tile_height - self.offset(scroll), self.size[0], self.size[1])
+
+
+# Stack of (image, BackgroundLayer options) layers, farthest first. The first layer should be
+# opaque, keyed layers above it only cover their bright pixels. Speeds are fractions of the scroll
+# rate (1, 1/2, 1/3...) so every layer lines up again after period pixels of scrolling.
+class ScrollingBackground:
+    def __init__(self, size, layers):
+        self.size = size
+        self.layers = [BackgroundLayer(image, size, **options) for image, options in layers]
+        # Scroll distance after which every layer is back at offset 0, for wrapping the position
+        self.period = math.lcm(*(layer.tile_height * max(1, round(1 / layer.speed)) for layer in self.layers))
+        self.frames = {}
+
+    def draw(self, target, scroll):
+        # target is a Surface or a RenderQueue
+        for layer in self.layers:
+            target.blit(layer.strip, (0, 0), layer.area(scroll))
+
+    def frame(self, scroll, max_frames=4):
+        # Flattened copy for screens that redraw the same backdrop repeatedly (menus, pause)
+        key = tuple(layer.offset(scroll) for layer in self.layers)
+        frame = self.frames.get(key)
+        if frame is None:
+            if len(self.frames) >= max_frames:
+                self.frames.pop(next(iter(self.frames)))
+            frame = self.frames[key] = pygame.Surface(self.size).convert()
+            self.draw(frame, scroll)
+        return frame
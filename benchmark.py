@@ -0,0 +1,229 @@
+# Headless, deterministic benchmark of the game simulation:
+#
+#     python benchmark.py --ticks 6000 --seed 1
+#     python benchmark.py --ticks 6000 --no-render --json report.json
+#     python benchmark.py --trace trace.json     # Chrome trace, or trace.csv for CSV
+#     python benchmark.py --wave max_enemies=400 --wave budget_rate=400 --wave max_budget_rate=400   # stress test
+#     python benchmark.py --net --latency 80 --jitter 20 --loss 0.05   # with a LAN client over localhost
+#
+# Runs on SDL's dummy video/audio drivers, so it needs no display or sound card.
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import asyncio
+import gc
+import json
+import random
+import sys
+import time
+
+import pygame
+
+import main
+import netplay
+from engine import TICK_RATE
+from profiler import PhaseTimer
+
+
+# Holds fire and picks a new movement direction every few ticks from its own RNG
+class RandomBot:
+    def __init__(self, seed, hold_ticks=60):
+        self.rng = random.Random(seed)
+        self.hold_ticks = hold_ticks
+        self.tick = 0
+        self.held = []
+
+    def __call__(self, session_tick):
+        events = []
+        new_direction = self.tick % self.hold_ticks == 0
+        if session_tick == 0:
+            # Every run after a death starts with a fresh input layer, so press everything again
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+            if not new_direction:
+                events.extend(pygame.event.Event(pygame.KEYDOWN, key=key) for key in self.held)
+        if new_direction:
+            for key in self.held:
+                events.append(pygame.event.Event(pygame.KEYUP, key=key))
+            self.held = [self.rng.choice([pygame.K_LEFT, pygame.K_RIGHT]),
+                         self.rng.choice([pygame.K_UP, pygame.K_DOWN, None])]
+            self.held = [key for key in self.held if key is not None]
+            for key in self.held:
+                events.append(pygame.event.Event(pygame.KEYDOWN, key=key))
+        self.tick += 1
+        return events
+
+
+# Replays a fixed script of (tick, "down" | "up", pygame key) entries
+class ScriptedInput:
+    def __init__(self, script):
+        self.script = sorted(script, key=lambda entry: entry[0])
+        self.position = 0
+        self.tick = 0
+
+    def __call__(self, session_tick):
+        events = []
+        while self.position < len(self.script) and self.script[self.position][0] <= self.tick:
+            _, action, key = self.script[self.position]
+            event_type = pygame.KEYDOWN if action == "down" else pygame.KEYUP
+            events.append(pygame.event.Event(event_type, key=key))
+            self.position += 1
+        self.tick += 1
+        return events
+
+
+# A LAN host and one client in this process, talking over localhost. Both run on the benchmark's
+# simulated clock (one tick per frame), so the simulated latency and loss are the same every run.
+class LoopbackNet:
+    def __init__(self, seed, role=netplay.PLAYER, latency=0.0, jitter=0.0, loss=0.0, hold_ticks=60):
+        self.now = 0.0
+        clock = lambda: self.now
+        loop = asyncio.new_event_loop()
+        self.loop = loop
+        self.host = netplay.NetHost(("127.0.0.1", 0), TICK_RATE, len(main.spaceship_prices), loop=loop, clock=clock,
+                                    conditioner=netplay.LinkConditioner(latency, jitter, loss, seed))
+        ship = main.spaceship_img(0)
+        bounds = (main.SCREEN_WIDTH - ship.get_width(), main.SCREEN_HEIGHT - ship.get_height())
+        self.client = netplay.NetClient(self.host.address, role, 0, bounds, loop=loop, clock=clock,
+                                        conditioner=netplay.LinkConditioner(latency, jitter, loss, seed + 1))
+        self.rng = random.Random(seed)
+        self.hold_ticks = hold_ticks
+        self.tick = 0
+        self.state = (False,) * 5
+
+    def input_source(self, input_source):
+        # The host's input source, stepping the client once per host frame before it
+        def frame_input(session_tick):
+            self.step()
+            return input_source(session_tick)
+        return frame_input
+
+    def step(self):
+        self.now += 1 / TICK_RATE
+        if self.tick % self.hold_ticks == 0:
+            rng = self.rng
+            # left, right, up, down, fire
+            self.state = (rng.random() < 0.5, rng.random() < 0.5, rng.random() < 0.3, rng.random() < 0.3, True)
+        self.tick += 1
+        client = self.client
+        client.pump()
+        client.tick(self.state)
+        client.view()
+
+    def report(self):
+        return {"host": self.host.stats(), "client": self.client.stats()}
+
+    def close(self):
+        self.client.close()
+        self.host.close()
+        self.loop.close()
+
+
+def _gc_collections():
+    return [stat["collections"] for stat in gc.get_stats()]
+
+
+def run_benchmark(ticks, seed=0, input_source=None, render=True, phases=None, waves=None, net=None):
+    seeds = random.Random(seed)
+    input_source = input_source or RandomBot(seed)
+    if net is not None:
+        input_source = net.input_source(input_source)
+    phases = phases or PhaseTimer()
+    runs = []
+    gc_before = _gc_collections()
+    blocks_before = sys.getallocatedblocks()
+    start = time.perf_counter()
+
+    # Deaths restart the run so the benchmark always covers the requested number of ticks
+    total = 0
+    while total < ticks:
+        main.current_state = main.GAME
+        result = main.game_loop(input_source=input_source, max_ticks=ticks - total, phases=phases, render=render,
+                                seed=seeds.randrange(2 ** 32), waves=waves or main.ENDLESS_WAVES,
+                                net=net.host if net is not None else None)
+        runs.append(result)
+        total += result["ticks"]
+
+    elapsed = time.perf_counter() - start
+    gc_after = _gc_collections()
+    report = {
+        "seed": seed,
+        "ticks": total,
+        "seconds": elapsed,
+        "ticks_per_second": total / elapsed if elapsed else 0.0,
+        "runs": runs,
+        "phases": phases.report(),
+        "allocated_blocks_delta": sys.getallocatedblocks() - blocks_before,
+        "gc_collections": [after - before for before, after in zip(gc_before, gc_after)],
+        "pool_instances_created": {
+            "enemies": main.enemies.pool.created,
+            "powerups": main.powerups.pool.created,
+            "meteors": main.meteors.pool.created,
+        },
+        "text_cache": main.text_cache.stats(),
+        "assets": main.assets.stats(),
+        "audio": main.audio.stats(),
+        "input_latency_ms": main.input_latency.percentiles(),
+    }
+    if net is not None:
+        report["net"] = net.report()
+    return report
+
+
+def print_report(report):
+    print(f"{report['ticks']} ticks in {report['seconds']:.2f}s ({report['ticks_per_second']:.0f} ticks/s), "
+          f"seed {report['seed']}, {len(report['runs'])} run(s)")
+    for name, phase in sorted(report["phases"].items(), key=lambda item: -item[1]["total_ms"]):
+        print(f"  {name:<10} {phase['total_ms']:10.1f} ms  {phase['mean_ms'] * 1000:8.1f} us/lap  "
+              f"frame p50/p95/p99 {phase['p50_ms']:.3f}/{phase['p95_ms']:.3f}/{phase['p99_ms']:.3f} ms")
+    print(f"  allocated blocks delta {report['allocated_blocks_delta']}, gc collections {report['gc_collections']}")
+    print(f"  pool instances created {report['pool_instances_created']}")
+    latency = report["input_latency_ms"]
+    print(f"  input to present p50/p95/p99 {latency[50]:.2f}/{latency[95]:.2f}/{latency[99]:.2f} ms")
+    if "net" in report:
+        host, client = report["net"]["host"], report["net"]["client"]
+        print(f"  net host: {host['states_sent']} states ({host['full_states']} full), {host['mean_state_bytes']:.0f} B/state, "
+              f"{host['kbps_sent']:.1f} kbit/s out, {host['kbps_received']:.1f} kbit/s in, {host['dropped']} dropped")
+        print(f"  net client: {client['states']} states, {client['undecodable']} undecodable, interval p50/p95 "
+              f"{client['state_interval_p50_ms']:.1f}/{client['state_interval_p95_ms']:.1f} ms, {client['held_frames']} held frames, "
+              f"{client['corrections']} corrections (mean {client['mean_correction_px']:.2f} px)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the game simulation headless and report timings.")
+    parser.add_argument("--ticks", type=int, default=6000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-render", action="store_true", help="skip drawing, time the simulation only")
+    parser.add_argument("--json", metavar="PATH", help="also write the full report as JSON")
+    parser.add_argument("--trace", metavar="PATH", help="write every phase lap as a Chrome trace (.json) or CSV (.csv)")
+    parser.add_argument("--wave", metavar="KEY=VALUE", action="append", default=[],
+                        help="override a wave director setting from main.ENDLESS_WAVES, e.g. max_enemies=400")
+    parser.add_argument("--net", action="store_true", help="also stream the run to a LAN client over localhost")
+    parser.add_argument("--spectate", action="store_true", help="with --net, the client only watches")
+    parser.add_argument("--latency", type=float, default=0.0, help="with --net, added one-way latency in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="with --net, extra random latency in ms")
+    parser.add_argument("--loss", type=float, default=0.0, help="with --net, share of packets dropped, 0..1")
+    args = parser.parse_args()
+    waves = dict(main.ENDLESS_WAVES)
+    for override in args.wave:
+        key, _, value = override.partition("=")
+        if key not in waves or key == "formations":
+            parser.error(f"unknown wave setting {key!r}")
+        waves[key] = float(value)
+    phases = PhaseTimer(trace=bool(args.trace))
+    net = None
+    if args.net:
+        net = LoopbackNet(args.seed, netplay.SPECTATOR if args.spectate else netplay.PLAYER,
+                          args.latency / 1000, args.jitter / 1000, args.loss)
+    report = run_benchmark(args.ticks, args.seed, render=not args.no_render, phases=phases, waves=waves, net=net)
+    if net is not None:
+        net.close()
+    print_report(report)
+    if args.trace:
+        phases.export_trace(args.trace)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
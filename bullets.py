@@ -0,0 +1,146 @@
+import math
+import numpy as np
+
+
+# Structure-of-arrays bullet store, live bullets are packed in [0, count)
+class BulletPool:
+    def __init__(self, width, height, hit_width, hit_height, capacity=1024):
+        self.width = width
+        self.height = height
+        self.hit_width = hit_width
+        self.hit_height = hit_height
+        self.count = 0
+        self._allocate(capacity)
+        self._directions = {}
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.prev_x = np.zeros(capacity)
+        self.prev_y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.angle = np.zeros(capacity, dtype=np.int16)
+        self.big = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def _arrays(self):
+        return (self.x, self.y, self.prev_x, self.prev_y, self.vx, self.vy, self.angle, self.big, self.alive)
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        old = self._arrays()
+        self._allocate(capacity)
+        for new, arr in zip(self._arrays(), old):
+            new[:len(arr)] = arr
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.alive[:self.count] = False
+        self.count = 0
+
+    def state(self):
+        # Copy of the live bullets, for snapshots
+        n = self.count
+        return [arr[:n].copy() for arr in self._arrays()]
+
+    def load_state(self, state):
+        self.clear()
+        n = len(state[0])
+        if n > self.capacity:
+            self._grow(n)
+        for arr, saved in zip(self._arrays(), state):
+            arr[:n] = saved
+        self.count = n
+
+    def directions(self, angles):
+        # Unit velocity vectors per firing pattern, computed once per distinct set of angles
+        key = tuple(angles)
+        direction = self._directions.get(key)
+        if direction is None:
+            radians = [math.radians(a) for a in key]
+            direction = (np.array([math.sin(r) for r in radians]), np.array([-math.cos(r) for r in radians]),
+                         np.array(key, dtype=np.int16))
+            self._directions[key] = direction
+        return direction
+
+    def spawn(self, x, y, big, speed, angles=(0,)):
+        # x may be a scalar or one value per angle (side-by-side double/triple shots)
+        dx, dy, angle = self.directions(angles)
+        n = len(angle)
+        start = self.count
+        end = start + n
+        if end > self.capacity:
+            self._grow(end)
+        self.x[start:end] = x
+        self.y[start:end] = y
+        self.prev_x[start:end] = self.x[start:end]
+        self.prev_y[start:end] = y
+        self.vx[start:end] = dx * speed
+        self.vy[start:end] = dy * speed
+        self.angle[start:end] = angle
+        self.big[start:end] = big
+        self.alive[start:end] = True
+        self.count = end
+
+    def update(self, dt):
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        self.prev_x[:n] = x
+        self.prev_y[:n] = y
+        x += self.vx[:n] * dt
+        y += self.vy[:n] * dt
+        alive = self.alive[:n]
+        np.logical_and(y > 0, x >= 0, out=alive)
+        alive &= x <= self.width
+        # Godmode fires downward too; keep a sprite height of margin below the screen
+        alive &= y < self.height + self.hit_height
+        self.compact()
+
+    def kill(self, i):
+        self.alive[i] = False
+
+    def compact(self):
+        # Swap-remove: dead slots below the new count are filled from live slots above it
+        n = self.count
+        alive = self.alive[:n]
+        live = int(np.count_nonzero(alive))
+        if live == n:
+            return
+        holes = np.flatnonzero(~alive[:live])
+        movers = np.flatnonzero(alive[live:]) + live
+        for arr in self._arrays():
+            arr[holes] = arr[movers]
+        self.alive[live:n] = False
+        self.count = live
+
+    def hit_candidates(self, grid):
+        # Vectorized broad phase: indices of bullets whose hit box touches an occupied grid cell
+        n = self.count
+        if n == 0 or not grid.cells:
+            return []
+        size = grid.cell_size
+        left = np.trunc(self.x[:n]).astype(np.int64)
+        top = np.trunc(self.y[:n]).astype(np.int64)
+        x0 = left // size
+        x1 = (left + self.hit_width - 1) // size
+        y0 = top // size
+        y1 = (top + self.hit_height - 1) // size
+        occupied = np.array([cx * 65536 + cy for cx, cy in grid.cells], dtype=np.int64)
+        mask = np.isin(x0 * 65536 + y0, occupied)
+        mask |= np.isin(x1 * 65536 + y0, occupied)
+        mask |= np.isin(x0 * 65536 + y1, occupied)
+        mask |= np.isin(x1 * 65536 + y1, occupied)
+        return np.flatnonzero(mask).tolist()
+
+    def positions(self, alpha=1.0):
+        n = self.count
+        x = self.prev_x[:n] + (self.x[:n] - self.prev_x[:n]) * alpha
+        y = self.prev_y[:n] + (self.y[:n] - self.prev_y[:n]) * alpha
+        return x, y
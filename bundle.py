@@ -0,0 +1,142 @@
+# Offline asset compiler: decodes and pre-scales every manifest image to raw pixels and
+# every sound to PCM in the mixer's format, and writes them to one file with a JSON index.
+#
+#     python bundle.py                 # writes data/assets.bundle
+#     python bundle.py --output PATH
+#
+# Layout: MAGIC, version and index length (little-endian uint32s), the JSON index, then the
+# data blobs. The index records the source content hash and the mixer format; a bundle
+# built from different files or for a different mixer setup is ignored at runtime.
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+import pygame
+
+MAGIC = b"SWBUNDLE"
+BUNDLE_VERSION = 1
+_HEADER = struct.Struct("<8sII")
+
+
+def source_hash(base_dir, manifest):
+    # Covers the manifest entries (sizes and alpha change the pixels) and the source files.
+    # Returns None if a source file is missing, e.g. in a build that only ships the bundle.
+    digest = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode())
+    for name in sorted(manifest):
+        try:
+            with open(os.path.join(base_dir, manifest[name]["path"]), "rb") as file:
+                digest.update(file.read())
+        except FileNotFoundError:
+            return None
+    return digest.hexdigest()
+
+
+def compile_bundle(path, base_dir, manifest):
+    entries = {}
+    blobs = []
+    offset = 0
+    for name, entry in manifest.items():
+        source = os.path.join(base_dir, entry["path"])
+        if entry.get("kind", "image") == "sound":
+            data = pygame.mixer.Sound(source).get_raw()
+            info = {"kind": "sound"}
+        else:
+            image = pygame.image.load(source)
+            if "size" in entry:
+                image = pygame.transform.scale(image, entry["size"])
+            pixel_format = "RGBA" if entry.get("alpha", True) else "RGB"
+            data = pygame.image.tobytes(image, pixel_format)
+            info = {"kind": "image", "size": list(image.get_size()), "format": pixel_format}
+        info["offset"] = offset
+        info["length"] = len(data)
+        entries[name] = info
+        blobs.append(data)
+        offset += len(data)
+
+    index = json.dumps({
+        "hash": source_hash(base_dir, manifest),
+        "mixer": list(pygame.mixer.get_init() or ()),
+        "entries": entries,
+    }).encode()
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, BUNDLE_VERSION, len(index)))
+        file.write(index)
+        for data in blobs:
+            file.write(data)
+    return offset
+
+
+# Read side: the file is memory-mapped and assets are built straight from slices of it
+class AssetBundle:
+    def __init__(self, file, data, index, data_start):
+        self.file = file
+        self.data = data
+        self.view = memoryview(data)
+        self.entries = index["entries"]
+        self.data_start = data_start
+
+    @classmethod
+    def open(cls, path, base_dir, manifest):
+        # Returns None when there is no bundle or it is from another version, source set or mixer format
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            file.close()
+            return None
+        magic, version, index_length = _HEADER.unpack_from(data) if len(data) >= _HEADER.size else (None, None, 0)
+        index = None
+        if magic == MAGIC and version == BUNDLE_VERSION:
+            index = json.loads(data[_HEADER.size:_HEADER.size + index_length])
+            current = source_hash(base_dir, manifest)
+            if current is not None and current != index["hash"]:
+                index = None
+            elif list(pygame.mixer.get_init() or ()) != index["mixer"]:
+                # PCM buffers are only valid for the mixer format they were decoded for
+                index["entries"] = {name: entry for name, entry in index["entries"].items() if entry["kind"] != "sound"}
+        if index is None:
+            data.close()
+            file.close()
+            return None
+        return cls(file, data, index, _HEADER.size + index_length)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def load(self, name):
+        entry = self.entries[name]
+        start = self.data_start + entry["offset"]
+        buffer = self.view[start:start + entry["length"]]
+        if entry["kind"] == "sound":
+            return pygame.mixer.Sound(buffer=buffer)
+        # The surface shares the mapped memory; converting it afterwards makes a private copy
+        return pygame.image.frombuffer(buffer, entry["size"], entry["format"])
+
+    def close(self):
+        self.view.release()
+        self.data.close()
+        self.file.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import main
+
+    parser = argparse.ArgumentParser(description="Compile the game's assets into a single bundle file.")
+    parser.add_argument("--output", default=main.BUNDLE_PATH)
+    args = parser.parse_args()
+    # The running game may hold the old bundle open
+    if main.assets.bundle is not None:
+        main.assets.bundle.close()
+        main.assets.bundle = None
+    size = compile_bundle(args.output, main.DATA_DIR, main.ASSET_MANIFEST)
+    print(f"Wrote {len(main.ASSET_MANIFEST)} assets ({size / 1024:.0f} KiB) to {args.output}")
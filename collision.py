@@ -0,0 +1,61 @@
+# Uniform grid size in pixels, roughly the size of the largest enemy
+CELL_SIZE = 64
+
+
+# Spatial hash broad phase, rebuilt every tick
+class SpatialHash:
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.entries = []
+        self.index = {}
+
+    def clear(self):
+        self.cells.clear()
+        self.entries.clear()
+        self.index.clear()
+
+    def _cells(self, rect):
+        size = self.cell_size
+        x0 = rect.left // size
+        x1 = max(rect.right - 1, rect.left) // size
+        y0 = rect.top // size
+        y1 = max(rect.bottom - 1, rect.top) // size
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                yield cx, cy
+
+    def insert(self, item, rect, kind=None):
+        i = len(self.entries)
+        self.entries.append((item, rect, kind))
+        self.index[id(item)] = i
+        for cell in self._cells(rect):
+            bucket = self.cells.get(cell)
+            if bucket is None:
+                self.cells[cell] = [i]
+            else:
+                bucket.append(i)
+
+    def remove(self, item):
+        # Entries are tombstoned so indices in the buckets stay valid until the next clear()
+        i = self.index.pop(id(item), None)
+        if i is not None:
+            self.entries[i] = None
+
+    def query(self, rect, kind=None):
+        # Candidates in insertion order, so results match a linear scan over the source list
+        found = set()
+        cells = self.cells
+        for cell in self._cells(rect):
+            bucket = cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        result = []
+        for i in sorted(found):
+            entry = self.entries[i]
+            if entry is not None and (kind is None or entry[2] == kind):
+                result.append(entry)
+        return result
+
+    def collisions(self, rect, kind=None):
+        return [item for item, other, _ in self.query(rect, kind) if rect.colliderect(other)]
@@ -0,0 +1,155 @@
+import time
+from collections import deque
+
+import pygame
+
+# Player actions, in replay action code order
+ACTIONS = ("left", "right", "up", "down", "fire")
+LEFT, RIGHT, UP, DOWN, FIRE = range(len(ACTIONS))
+
+DEFAULT_BINDINGS = {
+    "left": [pygame.K_LEFT, pygame.K_a],
+    "right": [pygame.K_RIGHT, pygame.K_d],
+    "up": [pygame.K_UP, pygame.K_w],
+    "down": [pygame.K_DOWN, pygame.K_s],
+    "fire": [pygame.K_SPACE],
+}
+# Gamepad buttons per action; the left stick and the d-pad always move
+DEFAULT_JOY_BUTTONS = {"fire": [0, 1]}
+JOY_DEADZONE = 0.35
+
+# Sets an action directly (event.action index, event.pressed), bypassing the bindings; replays use it
+ACTION_EVENT = pygame.event.custom_type()
+
+
+# Rolling input-to-present latency in milliseconds
+class LatencyMeter:
+    def __init__(self, window=240):
+        self.samples = deque(maxlen=window)
+
+    def add(self, ms):
+        self.samples.append(ms)
+
+    def percentiles(self, points=(50, 95, 99)):
+        samples = sorted(self.samples)
+        if not samples:
+            return {point: 0.0 for point in points}
+        return {point: samples[min(len(samples) - 1, len(samples) * point // 100)] for point in points}
+
+
+# Turns keyboard, gamepad and replay input into the action state of each simulation tick.
+# Events update the held actions as they arrive; sample() is called once per tick and returns the
+# state that tick runs with. A press released before the next sample still counts for one tick.
+# With poll_devices, pygame.key.get_pressed() and the gamepad sticks and buttons are also read at
+# every sample. Every input is timestamped and presented() turns those into input-to-present
+# latency once a frame showing it is on screen.
+class InputLayer:
+    def __init__(self, bindings=DEFAULT_BINDINGS, joy_buttons=DEFAULT_JOY_BUTTONS, poll_devices=True,
+                 latency=None, clock=time.perf_counter):
+        self.poll_devices = poll_devices
+        self.latency = latency
+        self.clock = clock
+        self.held = [False] * len(ACTIONS)
+        self.latched = [False] * len(ACTIONS)
+        self.state = (False,) * len(ACTIONS)
+        self.pending = []
+        self.applied = []
+        self.joysticks = {}
+        self.bind(bindings, joy_buttons)
+        if poll_devices:
+            # Pads connected before the game started; later ones arrive as JOYDEVICEADDED
+            for index in range(pygame.joystick.get_count()):
+                joystick = pygame.joystick.Joystick(index)
+                self.joysticks[joystick.get_instance_id()] = joystick
+
+    def bind(self, bindings, joy_buttons=None):
+        # bindings: action name -> key codes; actions left out keep no keys
+        self.action_keys = [list(bindings.get(action, ())) for action in ACTIONS]
+        self.key_actions = {key: index for index, keys in enumerate(self.action_keys) for key in keys}
+        if joy_buttons is not None:
+            self.button_actions = {button: ACTIONS.index(action) for action, buttons in joy_buttons.items() for button in buttons}
+
+    def handle_event(self, event):
+        # Returns True for events that belong to the input layer
+        if event.type in (pygame.KEYDOWN, pygame.KEYUP):
+            index = self.key_actions.get(event.key)
+            if index is None:
+                return False
+            self._set(index, event.type == pygame.KEYDOWN)
+        elif event.type == ACTION_EVENT:
+            self._set(event.action, event.pressed)
+        elif event.type in (pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP):
+            index = self.button_actions.get(event.button)
+            if index is not None:
+                self._set(index, event.type == pygame.JOYBUTTONDOWN)
+        elif event.type in (pygame.JOYAXISMOTION, pygame.JOYHATMOTION):
+            # Read by sample(), only timestamped here
+            self.pending.append(self.clock())
+        elif event.type == pygame.JOYDEVICEADDED:
+            joystick = pygame.joystick.Joystick(event.device_index)
+            self.joysticks[joystick.get_instance_id()] = joystick
+        elif event.type == pygame.JOYDEVICEREMOVED:
+            self.joysticks.pop(event.instance_id, None)
+        else:
+            return False
+        return True
+
+    def _set(self, index, pressed):
+        self.held[index] = pressed
+        if pressed:
+            self.latched[index] = True
+        self.pending.append(self.clock())
+
+    def _poll(self):
+        pressed = pygame.key.get_pressed()
+        held = [h or any(pressed[key] for key in keys) for h, keys in zip(self.held, self.action_keys)]
+        for joystick in self.joysticks.values():
+            x = joystick.get_axis(0) if joystick.get_numaxes() > 1 else 0.0
+            y = joystick.get_axis(1) if joystick.get_numaxes() > 1 else 0.0
+            hat_x, hat_y = joystick.get_hat(0) if joystick.get_numhats() else (0, 0)
+            held[LEFT] = held[LEFT] or x < -JOY_DEADZONE or hat_x < 0
+            held[RIGHT] = held[RIGHT] or x > JOY_DEADZONE or hat_x > 0
+            held[UP] = held[UP] or y < -JOY_DEADZONE or hat_y > 0
+            held[DOWN] = held[DOWN] or y > JOY_DEADZONE or hat_y < 0
+            for button, index in self.button_actions.items():
+                if button < joystick.get_numbuttons() and joystick.get_button(button):
+                    held[index] = True
+        return held
+
+    def sample(self):
+        # (state, changes): the action state for the next tick and [(action index, pressed)] since the last one
+        held = self._poll() if self.poll_devices else self.held
+        state = tuple(h or l for h, l in zip(held, self.latched))
+        self.latched = [False] * len(ACTIONS)
+        changes = [(index, pressed) for index, pressed in enumerate(state) if pressed != self.state[index]]
+        self.state = state
+        if self.pending:
+            self.applied.extend(self.pending)
+            self.pending.clear()
+        return state, changes
+
+    def release_all(self):
+        # Key releases can be missed while another screen has the event queue; the next sample
+        # records the releases
+        self.held = [False] * len(ACTIONS)
+        self.latched = [False] * len(ACTIONS)
+        self.pending.clear()
+
+    def presented(self):
+        # Call once the frame drawn after the latest ticks is on screen
+        if self.applied:
+            if self.latency is not None:
+                now = self.clock()
+                for stamp in self.applied:
+                    self.latency.add((now - stamp) * 1000)
+            self.applied.clear()
+
+    def get_state(self):
+        return list(self.held), self.state
+
+    def load_state(self, state):
+        held, self.state = state
+        self.held = list(held)
+        self.latched = [False] * len(ACTIONS)
+        self.pending.clear()
+        self.applied.clear()
@@ -0,0 +1,54 @@
+import pygame
+
+# Simulation runs at a fixed logic rate, rendering is capped separately
+TICK_RATE = 120
+MAX_FPS = 120
+
+# Longest real frame we try to catch up on (avoids the spiral of death after a stall)
+MAX_FRAME_TIME = 0.25
+
+
+def lerp(a, b, t):
+    return a + (b - a) * t
+
+
+# Fixed timestep clock with an accumulator
+class FixedTimestep:
+    def __init__(self, tick_rate=TICK_RATE, max_fps=MAX_FPS, max_frame_time=MAX_FRAME_TIME, realtime=True):
+        # realtime=False runs exactly one tick per frame without sleeping (headless runs)
+        self.realtime = realtime
+        self.tick_rate = tick_rate
+        self.dt = 1.0 / tick_rate
+        self.max_fps = max_fps
+        self.max_frame_time = max_frame_time
+        self.clock = pygame.time.Clock()
+        self.accumulator = 0.0
+        self.time = 0.0
+        self.ticks = 0
+        self.alpha = 0.0
+
+    def begin_frame(self):
+        if not self.realtime:
+            self.accumulator += self.dt
+            return
+        # Clock.tick sleeps to honour the render cap and returns the real frame time
+        frame_time = self.clock.tick(self.max_fps) / 1000.0
+        self.accumulator += min(frame_time, self.max_frame_time)
+
+    def step(self):
+        # Returns True while another logic tick should run this frame
+        if self.accumulator >= self.dt:
+            self.accumulator -= self.dt
+            self.time += self.dt
+            self.ticks += 1
+            return True
+        self.alpha = self.accumulator / self.dt
+        return False
+
+    def reset_clock(self):
+        # Drop time spent outside the loop (pause screen, menus) instead of fast-forwarding through it
+        self.clock.tick()
+        self.accumulator = 0.0
+
+    def get_fps(self):
+        return self.clock.get_fps()
@@ -0,0 +1,46 @@
+from bisect import bisect_left, insort
+
+
+# Best score per name, kept in rank order. The order list holds (-score, name) so a
+# bisect finds a name's rank and an update moves one entry instead of re-sorting the board.
+class Leaderboard:
+    def __init__(self, scores=None):
+        self.scores = dict(scores or {})
+        self.order = sorted((-score, name) for name, score in self.scores.items())
+        # Bumped on every change so screens know when their rendered rows are stale
+        self.version = 0
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __contains__(self, name):
+        return name in self.scores
+
+    def get(self, name, default=None):
+        return self.scores.get(name, default)
+
+    def submit(self, name, score):
+        # Keeps the best score; returns True if the board changed
+        old = self.scores.get(name)
+        if old is not None:
+            if score <= old:
+                return False
+            del self.order[bisect_left(self.order, (-old, name))]
+        self.scores[name] = score
+        insort(self.order, (-score, name))
+        self.version += 1
+        return True
+
+    def rank(self, name):
+        # 1-based, None for names without a score
+        score = self.scores.get(name)
+        if score is None:
+            return None
+        return bisect_left(self.order, (-score, name)) + 1
+
+    def page(self, start, count):
+        # [(rank, name, score)] for ranks start + 1 .. start + count
+        return [(start + i + 1, name, -score) for i, (score, name) in enumerate(self.order[start:start + count])]
+
+    def top(self, count):
+        return self.page(0, count)
@@ -1,11 +1,33 @@
 import pygame
 import random
 import math
-import json
 import time
 import os
-
-# Initialize pygame
+from engine import FixedTimestep, MAX_FPS, TICK_RATE, lerp
+from collision import SpatialHash
+from bullets import BulletPool
+from sprite_cache import SpriteCache
+from text_cache import TextCache, CachedText
+from pools import Pool, EntityList
+from particles import ParticleSystem
+from ui import UILayer, Label, Image, Slider, ButtonAtlas
+from profiler import NULL_TIMER, PhaseTimer, ProfilerOverlay
+from assets import AssetManager
+from audio import AudioManager
+from bundle import AssetBundle
+from store import GameStore, ENDLESS_BOARD
+from leaderboard import Leaderboard
+from replay import Replay, PAUSE_ACTION, encode_action
+from controls import InputLayer, LatencyMeter, ACTIONS, DEFAULT_BINDINGS, FIRE
+import savegame
+import netplay
+from powerups import ActiveEffects, fire_pattern
+from waves import WaveDirector
+from background import ScrollingBackground
+from render import RenderQueue, LAYER_BACKGROUND, LAYER_BULLETS, LAYER_ENEMIES, LAYER_ENEMY_LABELS, LAYER_PICKUPS, LAYER_PARTICLES, LAYER_PLAYER, LAYER_HUD
+
+# Initialize pygame, with a small mixer buffer so effects start with little delay
+pygame.mixer.pre_init(44100, -16, 2, 512)
 pygame.init()
 
 # Screen setup
@@ -21,34 +43,63 @@ DATA_DIR = "data"
 print("Current Working Directory:", os.getcwd())
 print("Constructed Font Path:", os.path.join(DATA_DIR, 'freesansbold.ttf'))
 
-# Load images
-game_over_img = pygame.image.load(os.path.join(DATA_DIR, "game_over.png"))
-background_img = pygame.image.load(os.path.join(DATA_DIR, "background.jpg")).convert()
-player_img = pygame.transform.scale(pygame.image.load(os.path.join(DATA_DIR, "enemy.png")), (80, 80))
-bullet_img = pygame.image.load(os.path.join(DATA_DIR, "bullet.png"))
-powerup_imgs = {
-    "speed": pygame.image.load(os.path.join(DATA_DIR, "powerup.png")),
-    "health": pygame.image.load(os.path.join(DATA_DIR, "powerup_health.png")),
-    "bullet": pygame.image.load(os.path.join(DATA_DIR, "powerup_bullet.png")),
-    "double": pygame.image.load(os.path.join(DATA_DIR, "powerup_double.png")),
-    "triple": pygame.image.load(os.path.join(DATA_DIR, "powerup_triple.png")),
-    "ashoot": pygame.image.load(os.path.join(DATA_DIR, "powerup_ashoot.png")),
-    "godmode": pygame.image.load(os.path.join(DATA_DIR, "powerup_godmode.png")),
-    "supermode": pygame.image.load(os.path.join(DATA_DIR, "powerup_supermode.png"))
+# Everything loaded from DATA_DIR. main() starts decoding on worker threads while the intro runs,
+# preload=False entries are only decoded when first used.
+ASSET_MANIFEST = {
+    "background": {"path": "background.jpg", "alpha": False},
+    "background_far": {"path": "background3.jpg", "alpha": False, "size": (SCREEN_WIDTH, SCREEN_HEIGHT)},
+    "background_nebula": {"path": "background2.jpg", "alpha": False, "size": (SCREEN_WIDTH, SCREEN_HEIGHT)},
+    "background_stars": {"path": "background1.png", "alpha": False, "size": (SCREEN_WIDTH, SCREEN_HEIGHT)},
+    "icon": {"path": "UFO.png"},
+    "bullet": {"path": "bullet.png"},
+    "meteor": {"path": "meteor.png", "size": (40, 40)},
+    "powerup_speed": {"path": "powerup.png"},
+    "powerup_health": {"path": "powerup_health.png"},
+    "powerup_bullet": {"path": "powerup_bullet.png"},
+    "powerup_double": {"path": "powerup_double.png"},
+    "powerup_triple": {"path": "powerup_triple.png"},
+    "powerup_ashoot": {"path": "powerup_ashoot.png"},
+    "powerup_godmode": {"path": "powerup_godmode.png"},
+    "powerup_supermode": {"path": "powerup_supermode.png"},
+    "powerup_invincibility": {"path": "powerup_invincibility.png"},
+    "powerup_rapid": {"path": "powerup_rapid.png"},
+    "game_over": {"path": "game_over.png", "preload": False},
+    "spaceship1": {"path": "spaceship1.png", "preload": False},
+    "spaceship2": {"path": "spaceship2.png", "preload": False},
+    "spaceship3": {"path": "spaceship3.png", "preload": False},
+    "spaceship4": {"path": "spaceship4.png", "preload": False},
+    "spaceship5": {"path": "spaceship5.png", "preload": False},
+    "game_over_sound": {"path": "game_over.mp3", "kind": "sound"},
+    "bullet_sound": {"path": "bullet_sounds.mp3", "kind": "sound"},
+    "explosion_sound": {"path": "explosion.mp3", "kind": "sound"},
+    "button_hover_sound": {"path": "button_hover.mp3", "kind": "sound"},
+    "button_click_sound": {"path": "button_click.mp3", "kind": "sound"},
+    "powerup_sound": {"path": "powerup.mp3", "kind": "sound"}
+}
+
+# Mixer channels reserved per sound group, and which group each sound plays in (see audio.AudioManager)
+AUDIO_GROUPS = {
+    "weapons": {"channels": 3, "volume": 0.6},
+    "impacts": {"channels": 4},
+    "ui": {"channels": 2},
 }
-meteor_img = pygame.transform.scale(pygame.image.load(os.path.join(DATA_DIR, "meteor.png")), (40, 40))
-icon = pygame.image.load(os.path.join(DATA_DIR, "UFO.png"))
-pygame.display.set_icon(icon)
-
-# Load sounds
-game_over_sound = pygame.mixer.Sound(os.path.join(DATA_DIR, "game_over.mp3"))
-bullet_sound = pygame.mixer.Sound(os.path.join(DATA_DIR, "bullet_sounds.mp3"))
-explosion_sound = pygame.mixer.Sound(os.path.join(DATA_DIR, "explosion.mp3"))
-button_hover_sound = pygame.mixer.Sound(os.path.join(DATA_DIR, "button_hover.mp3"))
-button_click_sound = pygame.mixer.Sound(os.path.join(DATA_DIR, "button_click.mp3"))
-powerup_sound = pygame.mixer.Sound(os.path.join(DATA_DIR, "powerup.mp3"))
-pygame.mixer.music.load(os.path.join(DATA_DIR, "background_music.mp3"))
-pygame.mixer.music.play(-1)
+SOUND_SETTINGS = {
+    "bullet_sound": {"group": "weapons", "priority": 1, "min_interval": 0.08},
+    "explosion_sound": {"group": "impacts", "priority": 1, "min_interval": 0.03},
+    "powerup_sound": {"group": "impacts", "priority": 2},
+    "game_over_sound": {"group": "ui", "priority": 3},
+    "button_hover_sound": {"group": "ui", "priority": 1, "min_interval": 0.05},
+    "button_click_sound": {"group": "ui", "priority": 2},
+}
+
+# Pre-decoded pixels and PCM built by bundle.py; skipped when missing or out of date
+BUNDLE_PATH = os.path.join(DATA_DIR, "assets.bundle")
+assets = AssetManager(DATA_DIR, ASSET_MANIFEST, bundle=AssetBundle.open(BUNDLE_PATH, DATA_DIR, ASSET_MANIFEST))
+audio = AudioManager(assets, AUDIO_GROUPS, SOUND_SETTINGS)
+
+# Needed for the first frame
+background_img = assets.get("background")
+pygame.display.set_icon(assets.get("icon"))
 
 # Font setup (fallback to system font if file not found)
 # Font setup
@@ -64,6 +115,14 @@ except FileNotFoundError:
     title_font = pygame.font.SysFont('Arial', 48)
     button_font = pygame.font.SysFont('Arial', 32)
 
+# Text render cache shared by the HUD, enemy health labels and menus
+text_cache = TextCache()
+score_label = CachedText(text_cache, font, "Score: {}")
+high_score_label = CachedText(text_cache, font, "High Score: {}")
+money_label = CachedText(text_cache, font, "Money: ${}")
+time_label = CachedText(text_cache, font, "Time: {}s")
+mission_label = CachedText(text_cache, font, "Mission: {} ({}/{})")
+
 # Rest of the code remains the same...
 
 # Rest of the code remains the same...
@@ -79,45 +138,69 @@ LEADERBOARD = "leaderboard"
 MISSIONS = "missions"
 MISSION_MODE = "mission_mode"
 HOW_TO_PLAY = "how_to_play"
+NET_GAME = "net_game"
 current_state = INTRO
 
 # Settings variables
 volume = 0.5
 vibration = True
 money = 0
-high_score = 0
+
+# Save data, the old JSON files in the working directory are imported the first time
+store = GameStore(os.path.join(DATA_DIR, "save.db"), legacy_dirs=(".", DATA_DIR))
+high_score = store.high_score()
 achievements = {
     "Meteor Dodger": False,
     "Power-Up Collector": False,
     "Speed Demon": False
 }
-try:
-    with open("high_score.json", "r") as file:
-        high_score = json.load(file)
-except FileNotFoundError:
-    high_score = 0
-try:
-    with open("achievements.json", "r") as file:
-        achievements.update(json.load(file))
-except FileNotFoundError:
-    pass
+achievements.update(store.achievements())
+# Key per action (controls.ACTIONS), saved as a JSON object in the save file
+key_bindings = dict(DEFAULT_BINDINGS, **store.bindings())
 
 # Slider properties
 slider_width = 200
 slider_height = 10
 slider_handle_radius = 10
 
-# Scrolling background variables
+# Game over backdrop (the old translucent overlay was drawn opaque on the display surface)
+game_over_background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+game_over_background.fill((0, 0, 0))
+
+# Scrolling background position, in pixels of the nearest layer
 scroll = 0
-bg_height = background_img.get_height()
+# The intro scrolls the plain background, the game modes a parallax stack (built on first use)
+intro_backdrop = ScrollingBackground((SCREEN_WIDTH, SCREEN_HEIGHT), [(background_img, {})])
+BACKDROP_LAYERS = {
+    "endless": [("background_far", {"speed": 1 / 4, "mirror": True}),
+                ("background_stars", {"speed": 1 / 2, "keyed": True}),
+                ("background", {"keyed": True})],
+    "mission": [("background_nebula", {"speed": 1 / 4, "mirror": True}),
+                ("background_stars", {"speed": 1 / 2, "keyed": True}),
+                ("background", {"keyed": True})],
+}
+backdrops = {}
+
+
+def get_backdrop(name):
+    backdrop = backdrops.get(name)
+    if backdrop is None:
+        layers = [(assets.get(asset), options) for asset, options in BACKDROP_LAYERS[name]]
+        backdrop = backdrops[name] = ScrollingBackground((SCREEN_WIDTH, SCREEN_HEIGHT), layers)
+    return backdrop
+
+# Speeds and timers below are in real time units (pixels per second, seconds)
+SCROLL_SPEED = 240
+PLAYER_SPEED = 360
+BULLET_SPEED = 168
+BOOST_DURATION = 5
+POWERUP_SPAWN_RATE = 1.2
+METEOR_SPAWN_RATE = 0.8
 
-# Game objects
-powerups = []
-meteors = []
-particles = []
+# Render frame cap, the simulation itself always ticks at engine.TICK_RATE
+max_fps = MAX_FPS
 
 # Spaceship setup
-spaceships = [pygame.image.load(f"spaceship{i}.png") for i in range(1, 6)]
 spaceship_prices = [0, 100, 200, 300, 400]
 spaceship_abilities = [
     "Speed Boost (+50%)",
@@ -129,13 +212,12 @@ spaceship_abilities = [
 owned_spaceships = [True, False, False, False, False]
 current_spaceship = 0
 
+def spaceship_img(index):
+    return assets.get(f"spaceship{index + 1}")
+
 # Leaderboard and user name
-leaderboard = {}
-try:
-    with open("leaderboard.json", "r") as file:
-        leaderboard = json.load(file)
-except FileNotFoundError:
-    leaderboard = {}
+leaderboards = {board: Leaderboard(scores) for board, scores in store.leaderboards().items()}
+LEADERBOARD_PAGE_SIZE = 5
 user_name = None
 
 # Notification variables
@@ -150,16 +232,48 @@ missions = [
     {"name": "Destroy 5 Meteors", "goal": "meteors", "target": 5, "reward": 40},
     {"name": "Score 50 Points", "goal": "score", "target": 50, "reward": 60}
 ]
-completed_missions = set()
-try:
-    with open("completed_missions.json", "r") as file:
-        completed_missions = set(json.load(file))
-except FileNotFoundError:
-    completed_missions = set()
+completed_missions = store.completed_missions()
 
 # Fire rate
 FIRE_RATE = 0.2
-last_shot_time = 0
+GODMODE_ANGLES = tuple(range(0, 360, 30))
+ASHOOT_ANGLES = (-30, -15, 0, 15, 30)
+
+# Shot layouts, weakest first: when several powerups set a pattern the later one here wins
+FIRE_PATTERNS = {
+    "single": fire_pattern(),
+    "double": fire_pattern((0, 0), (-20, 20)),
+    "triple": fire_pattern((0, 0, 0), (-20, 0, 20)),
+    "ashoot": fire_pattern(ASHOOT_ANGLES),
+    "godmode": fire_pattern(GODMODE_ANGLES),
+}
+
+# Powerup effects (see powerups.ActiveEffects for the fields). Every entry with pickup left on
+# spawns as a pickup using the "powerup_<name>" image.
+POWERUP_EFFECTS = {
+    "speed": {"duration": BOOST_DURATION, "speed": 2, "notification": "Speed Boost!"},
+    "health": {"heal": 1, "notification": "Health Restored!"},
+    "bullet": {"duration": BOOST_DURATION, "big_bullets": True, "notification": "Big Bullets!"},
+    "double": {"duration": BOOST_DURATION, "fire_pattern": "double", "notification": "Double Shoot!"},
+    "triple": {"duration": BOOST_DURATION, "fire_pattern": "triple", "notification": "Triple Shoot!"},
+    "ashoot": {"duration": BOOST_DURATION, "fire_pattern": "ashoot", "notification": "A Shoot!"},
+    "godmode": {"duration": BOOST_DURATION, "fire_pattern": "godmode", "notification": "God Mode Shoot!"},
+    "supermode": {"duration": BOOST_DURATION, "fire_pattern": "triple", "speed": 2, "bullet_speed": 1.5, "fire_rate": 0.05,
+                  "notification": "Super Mode Shoot!"},
+    "invincibility": {"duration": BOOST_DURATION, "stacking": "extend", "shield": True, "notification": "Invincible!"},
+    "rapid": {"duration": BOOST_DURATION, "fire_rate": 0.1, "notification": "Rapid Fire!"},
+    # The fifth ship's shield at the start of a run
+    "shield": {"duration": BOOST_DURATION, "shield": True, "pickup": False},
+}
+POWERUP_TYPES = [name for name, effect in POWERUP_EFFECTS.items() if effect.get("pickup", True)]
+
+# Bullet sprite variants, prewarmed for every angle the fire patterns use
+BIG_BULLET_SIZE = (20, 40)
+sprite_cache = SpriteCache()
+sprite_cache.prewarm("bullet", assets.get("bullet"), (None, BIG_BULLET_SIZE), sorted(set(GODMODE_ANGLES + ASHOOT_ANGLES)))
+
+# Button faces for every menu, rendered once per caption, size and color
+button_atlas = ButtonAtlas(button_font, text_cache)
 
 # Button class with animation
 class Button:
@@ -175,107 +289,216 @@ class Button:
         self.rect = pygame.Rect(x, y, width, height)
         self.hovered = False
         self.scale = 1.0
+        self.visible = True
+        self._face(False)
+        self._face(True)
+
+    def _face(self, hovered):
+        if hovered:
+            return button_atlas.face(self.text, (int(self.width * 1.1), int(self.height * 1.1)), self.active_color, self.text_color)
+        return button_atlas.face(self.text, (self.width, self.height), self.inactive_color, self.text_color)
 
     def draw(self, screen):
-        color = self.active_color if self.hovered else self.inactive_color
-        scaled_width = int(self.width * self.scale)
-        scaled_height = int(self.height * self.scale)
-        scaled_rect = pygame.Rect(self.x - (scaled_width - self.width) // 2, self.y - (scaled_height - self.height) // 2, scaled_width, scaled_height)
-        pygame.draw.rect(screen, color, scaled_rect, border_radius=10)
-        text_surf = button_font.render(self.text, True, self.text_color)
-        text_rect = text_surf.get_rect(center=scaled_rect.center)
-        screen.blit(text_surf, text_rect)
+        page, area = self._face(self.hovered)
+        screen.blit(page, (self.rect.centerx - area.width // 2, self.rect.centery - area.height // 2), area)
 
     def check_hover(self, mouse_pos):
-        self.hovered = self.rect.collidepoint(mouse_pos)
+        hovered = bool(self.rect.collidepoint(mouse_pos))
+        changed = hovered != self.hovered
+        self.hovered = hovered
         self.scale = 1.1 if self.hovered else 1.0
+        if changed and hovered:
+            audio.play("button_hover_sound")
+        return changed
+
+    def ui_state(self):
+        return self.text, self.hovered, self.inactive_color, self.active_color, self.text_color
+
+    def bounds(self):
+        # Covers the hovered 1.1x size and any caption wider than the button
+        text_width = text_cache.render(button_font, self.text, self.text_color).get_width()
+        width = max(int(self.width * 1.1), text_width) + 2
+        height = int(self.height * 1.1) + 2
+        return pygame.Rect(0, 0, width, height).move(self.rect.centerx - width // 2, self.rect.centery - height // 2)
+
     def check_click(self, mouse_pos):
         if self.rect.collidepoint(mouse_pos):
-            button_click_sound.play()
+            audio.play("button_click_sound")
             return True
         return False
 
+# Enemy bodies are pre-rasterized per (color, radius) so they can be batched with the other sprites
+enemy_sprites = {}
+
+def enemy_sprite(color, radius):
+    sprite = enemy_sprites.get((color, radius))
+    if sprite is None:
+        sprite = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, color, (radius, radius), radius)
+        pygame.draw.circle(sprite, (255, 255, 255), (radius, radius), radius, 2)
+        sprite = sprite.convert_alpha()
+        enemy_sprites[(color, radius)] = sprite
+    return sprite
+
+# Body radius per enemy type
+ENEMY_RADII = {"fast": 20, "tank": 40, "shooter": 30}
+
 # Enemy class
 class Enemy:
+    __slots__ = ("x", "y", "health", "color", "type", "radius", "speed", "prev_y", "rect", "slot", "uid")
+
     def __init__(self, x, y, health, color, type="fast"):
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.slot = -1
+        self.reset(x, y, health, color, type)
+
+    def reset(self, x, y, health, color, type="fast"):
         self.x = x
         self.y = y
         self.health = health
         self.color = color
         self.type = type
-        self.radius = 20 if type == "fast" else 40 if type == "tank" else 30
-        self.speed = 0.3 if type == "fast" else 0.1 if type == "tank" else 0.2
+        self.radius = ENEMY_RADII[type]
+        self.speed = 72 if type == "fast" else 24 if type == "tank" else 48
+        self.prev_y = y
+        self.rect.update(int(x - self.radius), int(y - self.radius), self.radius * 2, self.radius * 2)
 
-    def draw(self, screen):
-        pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), self.radius)
-        pygame.draw.circle(screen, (255, 255, 255), (int(self.x), int(self.y)), self.radius, 2)
-        health_text = font.render(f"{self.health}", True, (255, 255, 255))
-        screen.blit(health_text, (self.x - 10, self.y - 40))
+    def update(self, dt):
+        self.prev_y = self.y
+        self.y += self.speed * dt
+        self.rect.topleft = (int(self.x - self.radius), int(self.y - self.radius))
+
+    def draw(self, screen, alpha=1.0):
+        y = lerp(self.prev_y, self.y, alpha)
+        sprite = enemy_sprite(self.color, self.radius)
+        screen.blit(sprite, (int(self.x) - self.radius, int(y) - self.radius))
+
+    def draw_label(self, screen, alpha=1.0):
+        health_text = text_cache.render(font, f"{self.health}", (255, 255, 255))
+        screen.blit(health_text, (self.x - 10, lerp(self.prev_y, self.y, alpha) - 40))
 
 # Power-up class
 class PowerUp:
+    __slots__ = ("x", "y", "type", "speed", "image", "rect", "prev_y", "slot", "uid")
+
     def __init__(self, x, y, type):
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.slot = -1
+        self.reset(x, y, type)
+
+    def reset(self, x, y, type):
         self.x = x
         self.y = y
         self.type = type
-        self.speed = 0.3
-        self.image = powerup_imgs[type]
-        self.rect = self.image.get_rect(topleft=(x, y))
+        self.speed = 72
+        self.image = assets.get(f"powerup_{type}")
+        self.rect.size = self.image.get_size()
+        self.rect.topleft = (x, y)
+        self.prev_y = y
 
-    def draw(self, screen):
-        screen.blit(self.image, (self.x, self.y))
+    def update(self, dt):
+        self.prev_y = self.y
+        self.y += self.speed * dt
+        self.rect.topleft = (self.x, self.y)
+
+    def draw(self, screen, alpha=1.0):
+        screen.blit(self.image, (self.x, lerp(self.prev_y, self.y, alpha)))
 
 # Meteor class
 class Meteor:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.speed = 0.5
-        self.image = meteor_img
-        self.rect = self.image.get_rect(topleft=(x, y))
+    __slots__ = ("x", "y", "speed", "image", "rect", "prev_y", "slot", "uid")
 
-    def draw(self, screen):
-        screen.blit(self.image, (self.x, self.y))
+    def __init__(self, x, y):
+        self.image = assets.get("meteor")
+        self.rect = self.image.get_rect()
+        self.slot = -1
+        self.reset(x, y)
 
-# Particle class for explosion and confetti effects
-class Particle:
-    def __init__(self, x, y, color):
+    def reset(self, x, y):
         self.x = x
         self.y = y
-        self.color = color
-        self.radius = random.randint(2, 5)
-        self.dx = random.uniform(-2, 2)
-        self.dy = random.uniform(-2, 2)
-        self.lifetime = random.randint(20, 40)
-
-    def update(self):
-        self.x += self.dx
-        self.y += self.dy
-        self.lifetime -= 1
+        self.speed = 120
+        self.rect.topleft = (x, y)
+        self.prev_y = y
+
+    def update(self, dt):
+        self.prev_y = self.y
+        self.y += self.speed * dt
+        self.rect.topleft = (self.x, self.y)
+
+    def draw(self, screen, alpha=1.0):
+        screen.blit(self.image, (self.x, lerp(self.prev_y, self.y, alpha)))
+
+# Second player's ship in a co-op run, flown by a client of the net host (see GameSession.fly_wingman)
+class Wingman:
+    def __init__(self, peer):
+        self.peer = peer
+        self.ship_index = peer.ship
+        self.ship = spaceship_img(peer.ship)
+        self.speed = PLAYER_SPEED * (1.5 if peer.ship == 0 else 1)
+        self.max_x = SCREEN_WIDTH - self.ship.get_width()
+        self.max_y = SCREEN_HEIGHT - self.ship.get_height()
+        self.x = self.prev_x = min(SCREEN_WIDTH // 2 + 60, self.max_x)
+        self.y = self.prev_y = SCREEN_HEIGHT - 120
+        self.rect = self.ship.get_rect(topleft=(self.x, self.y))
+        self.last_shot_time = -FIRE_RATE
+
+    def update(self, state, dt):
+        # Same movement the client predicts with
+        self.prev_x = self.x
+        self.prev_y = self.y
+        self.x, self.y = netplay.move_ship(self.x, self.y, state, self.speed, dt, self.max_x, self.max_y)
+        self.rect.topleft = (self.x, self.y)
+
+# Per-frame draw commands for the game screens
+render_queue = RenderQueue()
+
+# Frame time breakdown, F3 in game toggles the overlay and the timing with it. Every lap is traced
+# while it is on; the trace is written to LAST_TRACE_PATH when the run ends or F3 turns it off.
+profiler = PhaseTimer(trace=True, max_trace_events=200000)
+profiler_overlay = ProfilerOverlay(pygame.font.Font(None, 22))
+# Input-to-present latency of the game sessions, shown in the overlay and the benchmark report
+input_latency = LatencyMeter()
+
+# Game objects, pooled and recycled between spawns
+enemies = EntityList(Pool(Enemy))
+powerups = EntityList(Pool(PowerUp))
+meteors = EntityList(Pool(Meteor))
+particles = ParticleSystem()
+
+# Bobbing main menu title
+class AnimatedTitle:
+    animating = True
+
+    def __init__(self):
+        self.visible = True
+        self.surface = text_cache.render(title_font, "Space Invaders", (255, 255, 255))
+        self.x = SCREEN_WIDTH // 2 - self.surface.get_width() // 2
+
+    def _y(self):
+        return int(200 + math.sin(time.time() * 3) * 20)
+
+    def ui_state(self):
+        return self._y()
+
+    def bounds(self):
+        return pygame.Rect(self.x, 180, self.surface.get_width(), self.surface.get_height() + 41)
 
     def draw(self, screen):
-        if self.lifetime > 0:
-            pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), self.radius)
-
-def animated_title():
-    title_text = title_font.render("Space Invaders", True, (255, 255, 255))
-    x = SCREEN_WIDTH // 2 - title_text.get_width() // 2
-    y = 200 + math.sin(time.time() * 3) * 20
-    screen.blit(title_text, (x, y))
+        screen.blit(self.surface, (self.x, self._y()))
 
 def show_score_health(score, player_health, elapsed_time):
-    score_text = font.render(f"Score: {score}", True, (255, 255, 255))
-    high_score_text = font.render(f"High Score: {high_score}", True, (255, 255, 255))
-    money_text = font.render(f"Money: ${money}", True, (255, 255, 255))
-    time_text = font.render(f"Time: {int(elapsed_time)}s", True, (255, 255, 255))
-    screen.blit(score_text, (10, 10))
-    screen.blit(high_score_text, (10, 40))
-    screen.blit(money_text, (10, 70))
-    screen.blit(time_text, (10, 100))
-    draw_health_bar(player_health)
-
-def draw_health_bar(player_health):
-    max_health = 3 + (1 if current_spaceship == 2 else 0)
+    score_text = score_label.render(score)
+    high_score_text = high_score_label.render(high_score)
+    money_text = money_label.render(money)
+    time_text = time_label.render(int(elapsed_time))
+    render_queue.set_layer(LAYER_HUD)
+    render_queue.blit(score_text, (10, 10))
+    render_queue.blit(high_score_text, (10, 40))
+    render_queue.blit(money_text, (10, 70))
+    render_queue.blit(time_text, (10, 100))
+
+def draw_health_bar(player_health, max_health):
     health_bar_width = 100
     health_bar_height = 10
     health_bar_x = SCREEN_WIDTH - health_bar_width - 10
@@ -285,16 +508,12 @@ def draw_health_bar(player_health):
     pygame.draw.rect(screen, (0, 255, 0), (health_bar_x, health_bar_y, current_health_width, health_bar_height))
 
 def fire_bullet(x, y, big_bullet=False, angle=0):
-    img = pygame.transform.scale(bullet_img, (20, 40)) if big_bullet else bullet_img
-    rotated_img = pygame.transform.rotate(img, angle)
-    screen.blit(rotated_img, (x - rotated_img.get_width() // 2, y - rotated_img.get_height() // 2))
-
-def rect_collision(rect1, rect2):
-    return rect1.colliderect(rect2)
+    rotated_img = sprite_cache.get("bullet", assets.get("bullet"), BIG_BULLET_SIZE if big_bullet else None, angle)
+    render_queue.blit(rotated_img, (x - rotated_img.get_width() // 2, y - rotated_img.get_height() // 2))
 
 def show_notification(text, duration=2):
     global notification_text, notification_timer
-    notification_text = font.render(text, True, (255, 255, 0))
+    notification_text = text_cache.render(font, text, (255, 255, 0))
     notification_timer = time.time() + duration
 
 def draw_notification():
@@ -302,18 +521,6 @@ def draw_notification():
     if notification_text and time.time() < notification_timer:
         screen.blit(notification_text, (SCREEN_WIDTH // 2 - notification_text.get_width() // 2, SCREEN_HEIGHT - 100))
 
-def draw_slider(x, y, value, min_value, max_value):
-    mouse = pygame.mouse.get_pos()
-    click = pygame.mouse.get_pressed()
-    slider_rect = pygame.Rect(x, y, slider_width, slider_height)
-    handle_x = x + int((value - min_value) / (max_value - min_value) * slider_width)
-    pygame.draw.rect(screen, (200, 200, 200), slider_rect, border_radius=5)
-    pygame.draw.circle(screen, (0, 128, 255), (handle_x, y + slider_height // 2), slider_handle_radius)
-    if click[0] == 1 and slider_rect.collidepoint(mouse):
-        value = min_value + (mouse[0] - x) / slider_width * (max_value - min_value)
-        value = max(min_value, min(max_value, value))
-    return value
-
 def intro_animation():
     global current_state, scroll
     start_time = time.time()
@@ -321,11 +528,12 @@ def intro_animation():
     virus_x = SCREEN_WIDTH // 2
     virus_y = -50
     virus_radius = 10
+    # Capped so the asset workers get CPU time while the intro plays
+    clock = pygame.time.Clock()
 
     while current_state == INTRO:
-        screen.blit(background_img, (0, scroll))
-        screen.blit(background_img, (0, scroll - bg_height))
-        scroll = (scroll + 1) % bg_height
+        intro_backdrop.draw(screen, scroll)
+        scroll = (scroll + 1) % intro_backdrop.period
 
         elapsed_time = time.time() - start_time
         if elapsed_time < 2:
@@ -337,19 +545,25 @@ def intro_animation():
             virus_y += 2
             virus_radius += 1
             pygame.draw.circle(screen, random.choice(virus_colors), (int(virus_x), int(virus_y)), virus_radius)
-            story1 = small_font.render("A massive virus, bigger than COVID-19,", True, (255, 255, 255))
-            story2 = small_font.render("has invaded space!", True, (255, 255, 255))
+            story1 = text_cache.render(small_font, "A massive virus, bigger than COVID-19,", (255, 255, 255))
+            story2 = text_cache.render(small_font, "has invaded space!", (255, 255, 255))
             screen.blit(story1, (SCREEN_WIDTH // 2 - story1.get_width() // 2, 400))
             screen.blit(story2, (SCREEN_WIDTH // 2 - story2.get_width() // 2, 430))
         elif elapsed_time < 8:
             pygame.draw.circle(screen, random.choice(virus_colors), (int(virus_x), int(virus_y)), virus_radius)
-            mission1 = small_font.render("Your mission: Defeat the viruses", True, (255, 255, 255))
-            mission2 = small_font.render("and dodge the meteors!", True, (255, 255, 255))
+            mission1 = text_cache.render(small_font, "Your mission: Defeat the viruses", (255, 255, 255))
+            mission2 = text_cache.render(small_font, "and dodge the meteors!", (255, 255, 255))
             screen.blit(mission1, (SCREEN_WIDTH // 2 - mission1.get_width() // 2, 400))
             screen.blit(mission2, (SCREEN_WIDTH // 2 - mission2.get_width() // 2, 430))
         else:
             current_state = MAIN_MENU
 
+        # Loading progress while the asset workers finish decoding
+        loaded, total = assets.poll()
+        if loaded < total:
+            pygame.draw.rect(screen, (80, 80, 80), (SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT - 80, 300, 10))
+            pygame.draw.rect(screen, (255, 255, 255), (SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT - 80, 300 * loaded // total, 10))
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
@@ -358,35 +572,48 @@ def intro_animation():
                 current_state = MAIN_MENU
 
         pygame.display.update()
+        if "first_frame" not in assets.marks:
+            assets.mark("first_frame")
+        clock.tick(MAX_FPS)
 
 def main_menu():
-    global current_state, user_name
+    global current_state, user_name, paused_session
+    continue_button = Button("Continue", SCREEN_WIDTH // 2 - 100, 300, 200, 50, (150, 100, 0), (255, 170, 0))
+    join_button = Button("Join Host", SCREEN_WIDTH // 2 - 100, 300, 200, 50, (0, 100, 150), (0, 170, 255))
     start_button = Button("Start Game", SCREEN_WIDTH // 2 - 100, 300, 200, 50, (0, 0, 150), (0, 0, 255))
     missions_button = Button("Missions", SCREEN_WIDTH // 2 - 100, 400, 200, 50, (150, 150, 0), (255, 255, 0))
     settings_button = Button("Settings", SCREEN_WIDTH // 2 - 100, 500, 200, 50, (0, 150, 0), (0, 255, 0))
     shop_button = Button("Shop", SCREEN_WIDTH // 2 - 100, 600, 200, 50, (150, 0, 150), (255, 0, 255))
     leaderboard_button = Button("Leaderboard", SCREEN_WIDTH // 2 - 100, 700, 200, 50, (0, 150, 150), (0, 255, 255))
     exit_button = Button("Exit", SCREEN_WIDTH // 2 - 100, 800, 200, 50, (150, 0, 0), (255, 0, 0))
-    
+    buttons = [start_button, missions_button, settings_button, shop_button, leaderboard_button, exit_button]
+    has_save = os.path.exists(SAVE_PATH)
+    if has_save:
+        buttons.insert(0, continue_button)
+    if net_join is not None:
+        buttons.insert(0, join_button)
+    # Column from y 300 (below the title) to 800, tighter when there are extra buttons
+    step = min(100, 500 // (len(buttons) - 1))
+    for i, button in enumerate(buttons):
+        button.rect.y = 300 + i * step
+
     name_input = ""
     input_active = user_name is None
 
-    while current_state == MAIN_MENU:
-        screen.blit(background_img, (0, 0))
-        animated_title()
+    ui = UILayer(screen, intro_backdrop.frame(scroll))
+    ui.add(AnimatedTitle())
+    name_label = ui.add(Label(text_cache, font, "", (SCREEN_WIDTH // 2, 300), center=True))
+    for button in buttons:
+        ui.add(button)
 
-        if input_active:
-            name_text = font.render("Enter Name: " + name_input, True, (255, 255, 255))
-            screen.blit(name_text, (SCREEN_WIDTH // 2 - name_text.get_width() // 2, 300))
-        else:
-            start_button.draw(screen)
-            missions_button.draw(screen)
-            settings_button.draw(screen)
-            shop_button.draw(screen)
-            leaderboard_button.draw(screen)
-            exit_button.draw(screen)
+    while current_state == MAIN_MENU:
+        name_label.text = "Enter Name: " + name_input
+        name_label.visible = input_active
+        for button in buttons:
+            button.visible = not input_active
+        ui.refresh()
 
-        for event in pygame.event.get():
+        for event in ui.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 quit()
@@ -400,7 +627,18 @@ def main_menu():
                     name_input += event.unicode
             if not input_active and event.type == pygame.MOUSEBUTTONDOWN:
                 mouse_pos = pygame.mouse.get_pos()
-                if start_button.check_click(mouse_pos):
+                if net_join is not None and join_button.check_click(mouse_pos):
+                    current_state = NET_GAME
+                elif has_save and continue_button.check_click(mouse_pos):
+                    paused_session = load_session(net=net_host)
+                    if paused_session is None:
+                        # Unreadable save, drop it
+                        savegame.delete(SAVE_PATH)
+                        has_save = continue_button.visible = False
+                        buttons.remove(continue_button)
+                    else:
+                        current_state = paused_session.rules.state
+                elif start_button.check_click(mouse_pos):
                     current_state = GAME
                 elif missions_button.check_click(mouse_pos):
                     current_state = MISSIONS
@@ -414,15 +652,7 @@ def main_menu():
                     pygame.quit()
                     quit()
             if event.type == pygame.MOUSEMOTION:
-                mouse_pos = pygame.mouse.get_pos()
-                start_button.check_hover(mouse_pos)
-                missions_button.check_hover(mouse_pos)
-                settings_button.check_hover(mouse_pos)
-                shop_button.check_hover(mouse_pos)
-                leaderboard_button.check_hover(mouse_pos)
-                exit_button.check_hover(mouse_pos)
-
-        pygame.display.update()
+                ui.hover(event.pos)
 
 def how_to_play_screen():
     global current_state
@@ -440,22 +670,23 @@ def how_to_play_screen():
         "Watch out for different enemy types!"
     ]
 
+    ui = UILayer(screen, intro_backdrop.frame(scroll))
+    for i, line in enumerate(instructions):
+        ui.add(Label(text_cache, small_font, line, (SCREEN_WIDTH // 2, 300 + i * 30), center=True))
+    ui.add(back_button)
+
     while current_state == HOW_TO_PLAY:
-        screen.blit(background_img, (0, 0))
-        for i, line in enumerate(instructions):
-            text = small_font.render(line, True, (255, 255, 255))
-            screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, 300 + i * 30))
-        back_button.draw(screen)
+        ui.refresh()
 
-        for event in pygame.event.get():
+        for event in ui.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 quit()
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if back_button.check_click(pygame.mouse.get_pos()):
                     current_state = MAIN_MENU
-
-        pygame.display.update()
+            if event.type == pygame.MOUSEMOTION:
+                ui.hover(event.pos)
 
 def missions_screen():
     global current_state
@@ -467,15 +698,16 @@ def missions_screen():
         for i, m in enumerate(missions)
     ]
 
+    ui = UILayer(screen, intro_backdrop.frame(scroll))
+    ui.add(back_button)
+    for i, btn in enumerate(mission_buttons):
+        ui.add(btn)
+        ui.add(Label(text_cache, small_font, f"Reward: ${missions[i]['reward']}", (50, 200 + i * 100)))
+
     while current_state == MISSIONS:
-        screen.blit(background_img, (0, 0))
-        back_button.draw(screen)
-        for i, btn in enumerate(mission_buttons):
-            btn.draw(screen)
-            reward_text = small_font.render(f"Reward: ${missions[i]['reward']}", True, (255, 255, 255))
-            screen.blit(reward_text, (50, 200 + i * 100))
+        ui.refresh()
 
-        for event in pygame.event.get():
+        for event in ui.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 quit()
@@ -485,505 +717,764 @@ def missions_screen():
                     current_state = MAIN_MENU
                 for i, btn in enumerate(mission_buttons):
                     if btn.check_click(mouse_pos) and i not in completed_missions:
-                        mission_mode(i)
+                        mission_mode(i, net=net_host)
+                        # The mission drew over the whole window
+                        ui.invalidate()
                         if current_state == MISSIONS:
                             btn.text = missions[i]["name"] + (" (Completed)" if i in completed_missions else "")
+            if event.type == pygame.MOUSEMOTION:
+                ui.hover(event.pos)
 
-        pygame.display.update()
-
-def mission_mode(mission_index):
-    global current_state, money, completed_missions, scroll, last_shot_time
-    current_state = MISSION_MODE
-    mission = missions[mission_index]
-    player_x = SCREEN_WIDTH // 2 - 40
-    player_y = SCREEN_HEIGHT - 120
-    player_speed = 1.5 * (1.5 if current_spaceship == 0 else 1)
-    player_health = 3
-    player_boost = {"speed": False, "bullet": False, "speed_time": 0, "bullet_time": 0, "shield": current_spaceship == 4, 
-                    "shield_time": 0, "double": False, "double_time": 0, "triple": False, "triple_time": 0, 
-                    "ashoot": False, "ashoot_time": 0, "godmode": False, "godmode_time": 0, 
-                    "supermode": False, "supermode_time": 0}
-    player_x_change = 0
-    player_y_change = 0
-    player_rect = spaceships[current_spaceship].get_rect(topleft=(player_x, player_y))
-
-    colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255)]
-    enemy_types = ["fast", "tank", "shooter"]
-    enemies = [Enemy(random.randint(0, SCREEN_WIDTH - 60), -50 - i * 300, random.randint(1, 100), random.choice(colors), random.choice(enemy_types)) for i in range(3)]
-    bullets = []
-    score = 0
-    mission_progress = {"enemies": 0, "powerups": 0, "time": 0, "meteors": 0, "score": 0}
-    start_time = time.time()
-
-    pause_button = Button("Pause", SCREEN_WIDTH - 110, SCREEN_HEIGHT - 50, 100, 40, (150, 150, 150), (200, 200, 200))
-    firing = False
-
-    while current_state == MISSION_MODE:
-        screen.blit(background_img, (0, scroll))
-        screen.blit(background_img, (0, scroll - bg_height))
-        scroll = (scroll + 1) % bg_height
-
-        current_time = time.time()
-        current_fire_rate = 0.05 if player_boost["supermode"] else FIRE_RATE
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_LEFT:
-                    player_x_change = -player_speed * (2 if player_boost["speed"] or player_boost["supermode"] else 1)
-                if event.key == pygame.K_RIGHT:
-                    player_x_change = player_speed * (2 if player_boost["speed"] or player_boost["supermode"] else 1)
-                if event.key == pygame.K_UP:
-                    player_y_change = -player_speed * (2 if player_boost["speed"] or player_boost["supermode"] else 1)
-                if event.key == pygame.K_DOWN:
-                    player_y_change = player_speed * (2 if player_boost["speed"] or player_boost["supermode"] else 1)
-                if event.key == pygame.K_SPACE:
-                    firing = True
-            if event.type == pygame.KEYUP:
-                if event.key in (pygame.K_LEFT, pygame.K_RIGHT):
-                    player_x_change = 0
-                if event.key in (pygame.K_UP, pygame.K_DOWN):
-                    player_y_change = 0
-                if event.key == pygame.K_SPACE:
-                    firing = False
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if pause_button.check_click(pygame.mouse.get_pos()):
-                    current_state = PAUSED
-
-        if firing and (current_time - last_shot_time >= current_fire_rate):
-            bullet_x = player_x + spaceships[current_spaceship].get_width() // 2 - bullet_img.get_width() // 2
-            bullet_speed = 0.7 * (1.5 if current_spaceship == 3 or player_boost["supermode"] else 1)
-            if player_boost["godmode"]:
-                for angle in range(0, 360, 30):
-                    bullets.append({"x": bullet_x, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": angle})
-            elif player_boost["ashoot"]:
-                for angle in [-30, -15, 0, 15, 30]:
-                    bullets.append({"x": bullet_x, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": angle})
-            elif player_boost["triple"] or player_boost["supermode"]:
-                bullets.append({"x": bullet_x - 20, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": 0})
-                bullets.append({"x": bullet_x, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": 0})
-                bullets.append({"x": bullet_x + 20, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": 0})
-            elif player_boost["double"]:
-                bullets.append({"x": bullet_x - 20, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": 0})
-                bullets.append({"x": bullet_x + 20, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": 0})
-            else:
-                bullets.append({"x": bullet_x, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": 0})
-            bullet_sound.play()
-            last_shot_time = current_time
-
-        player_x = max(0, min(player_x + player_x_change, SCREEN_WIDTH - spaceships[current_spaceship].get_width()))
-        player_y = max(0, min(player_y + player_y_change, SCREEN_HEIGHT - spaceships[current_spaceship].get_height()))
-        player_rect.topleft = (player_x, player_y)
-
-        for key in ["speed", "bullet", "shield", "double", "triple", "ashoot", "godmode", "supermode"]:
-            if player_boost[key] and current_time - player_boost[f"{key}_time"] > 5:
-                player_boost[key] = False
-
-        mission_progress["time"] = current_time - start_time
-
-        for bullet in bullets[:]:
-            angle_rad = math.radians(bullet["angle"])
-            bullet["x"] += bullet["speed"] * math.sin(angle_rad)
-            bullet["y"] -= bullet["speed"] * math.cos(angle_rad)
-            fire_bullet(bullet["x"], bullet["y"], bullet["big"], bullet["angle"])
-            if bullet["y"] <= 0 or bullet["x"] < 0 or bullet["x"] > SCREEN_WIDTH:
-                bullets.remove(bullet)
-
-        for enemy in enemies[:]:
-            enemy.y += enemy.speed
-            enemy.draw(screen)
-            enemy_rect = pygame.Rect(enemy.x - enemy.radius, enemy.y - enemy.radius, enemy.radius * 2, enemy.radius * 2)
-            if rect_collision(player_rect, enemy_rect) and not player_boost["shield"]:
-                player_health -= 1
-                enemies.remove(enemy)
-                enemies.append(Enemy(random.randint(0, SCREEN_WIDTH - 60), -50, 5, random.choice(colors)))
-                explosion_sound.play()
-                for _ in range(10):
-                    particles.append(Particle(enemy.x, enemy.y, enemy.color))
-            elif enemy.y > SCREEN_HEIGHT:
-                enemies.remove(enemy)
-                enemies.append(Enemy(random.randint(0, SCREEN_WIDTH - 60), -50, 5, random.choice(colors)))
-
-        for bullet in bullets[:]:
-            for enemy in enemies[:]:
-                if rect_collision(pygame.Rect(bullet["x"], bullet["y"], bullet_img.get_width(), bullet_img.get_height()), 
-                                  pygame.Rect(enemy.x - enemy.radius, enemy.y - enemy.radius, enemy.radius * 2, enemy.radius * 2)):
-                    bullets.remove(bullet)
-                    enemy.health -= 2
-                    if enemy.health <= 0:
-                        enemies.remove(enemy)
-                        enemies.append(Enemy(random.randint(0, SCREEN_WIDTH - 60), -50, 5, random.choice(colors)))
-                        score += 10
-                        mission_progress["enemies"] += 1
-                        mission_progress["score"] = score
-                        for _ in range(10):
-                            particles.append(Particle(enemy.x, enemy.y, enemy.color))
-                    break
-
-        if not powerups and random.randint(1, 200) == 1:
-            powerup_type = random.choice(["speed", "health", "bullet", "double", "triple", "ashoot", "godmode", "supermode"])
-            powerups.append(PowerUp(random.randint(0, SCREEN_WIDTH - 64), -50, powerup_type))
-
-        for powerup in powerups[:]:
-            powerup.y += powerup.speed
-            powerup.rect.topleft = (powerup.x, powerup.y)
-            powerup.draw(screen)
-            if rect_collision(player_rect, powerup.rect):
-                if powerup.type == "speed":
-                    player_boost["speed"] = True
-                    player_boost["speed_time"] = time.time()
-                    show_notification("Speed Boost!")
-                elif powerup.type == "health":
-                    player_health = min(3 + (1 if current_spaceship == 2 else 0), player_health + 1)
-                    show_notification("Health Restored!")
-                elif powerup.type == "bullet":
-                    player_boost["bullet"] = True
-                    player_boost["bullet_time"] = time.time()
-                    show_notification("Big Bullets!")
-                elif powerup.type == "double":
-                    player_boost["double"] = True
-                    player_boost["double_time"] = time.time()
-                    show_notification("Double Shoot!")
-                elif powerup.type == "triple":
-                    player_boost["triple"] = True
-                    player_boost["triple_time"] = time.time()
-                    show_notification("Triple Shoot!")
-                elif powerup.type == "ashoot":
-                    player_boost["ashoot"] = True
-                    player_boost["ashoot_time"] = time.time()
-                    show_notification("A Shoot!")
-                elif powerup.type == "godmode":
-                    player_boost["godmode"] = True
-                    player_boost["godmode_time"] = time.time()
-                    show_notification("God Mode Shoot!")
-                elif powerup.type == "supermode":
-                    player_boost["supermode"] = True
-                    player_boost["supermode_time"] = time.time()
-                    show_notification("Super Mode Shoot!")
-                powerups.remove(powerup)
-                mission_progress["powerups"] += 1
-                powerup_sound.play()
-            elif powerup.y > SCREEN_HEIGHT:
-                powerups.remove(powerup)
-
-        if not meteors and random.randint(1, 300) == 1:
-            meteors.append(Meteor(random.randint(0, SCREEN_WIDTH - 40), -50))
+def binding_text(action):
+    keys = " / ".join(pygame.key.name(key).upper() for key in key_bindings.get(action, ()))
+    return f"{action.capitalize()}: {keys or '-'}"
 
-        for meteor in meteors[:]:
-            meteor.y += meteor.speed
-            meteor.rect.topleft = (meteor.x, meteor.y)
-            meteor.draw(screen)
-            if rect_collision(player_rect, meteor.rect) and not player_boost["shield"]:
-                player_health -= 1
-                meteors.remove(meteor)
-                explosion_sound.play()
-                for _ in range(10):
-                    particles.append(Particle(meteor.x, meteor.y, (150, 150, 150)))
-            elif meteor.y > SCREEN_HEIGHT:
-                meteors.remove(meteor)
-                mission_progress["meteors"] += 1
-
-        for particle in particles[:]:
-            particle.update()
-            particle.draw(screen)
-            if particle.lifetime <= 0:
-                particles.remove(particle)
-
-        screen.blit(spaceships[current_spaceship], (player_x, player_y))
-        show_score_health(score, player_health, current_time - start_time)
-        pause_button.draw(screen)
-        mission_text = font.render(f"Mission: {mission['name']} ({mission_progress[mission['goal']]}/{mission['target']})", True, (255, 255, 255))
-        screen.blit(mission_text, (10, 130))
-        draw_notification()
-
-        if mission_progress[mission["goal"]] >= mission["target"]:
-            money += mission["reward"]
-            completed_missions.add(mission_index)
-            with open("completed_missions.json", "w") as file:
-                json.dump(list(completed_missions), file)
-            show_notification(f"Mission Completed! Reward: ${mission['reward']}")
-            current_state = MISSIONS
-            return
 
-        if player_health <= 0:
-            show_notification("Mission Failed!")
-            current_state = MISSIONS
-            return
+def rebind(action, key):
+    # The key moves to action, replacing its keys, and is taken off any other action
+    for other in ACTIONS:
+        key_bindings[other] = [k for k in key_bindings.get(other, ()) if k != key]
+    key_bindings[action] = [key]
+    store.save_bindings(key_bindings)
 
-        pygame.display.update()
 
 def settings_screen():
     global current_state, volume, vibration
-    back_button = Button("Back", SCREEN_WIDTH // 2 - 100, 600, 200, 50, (150, 0, 0), (255, 0, 0))
-    vibration_button = Button("Vibration: " + ("On" if vibration else "Off"), SCREEN_WIDTH // 2 - 150, 400, 300, 50, (0, 150, 0), (0, 255, 0))
+    back_button = Button("Back", SCREEN_WIDTH // 2 - 100, 680, 200, 50, (150, 0, 0), (255, 0, 0))
+    vibration_button = Button("Vibration: " + ("On" if vibration else "Off"), SCREEN_WIDTH // 2 - 150, 260, 300, 50, (0, 150, 0), (0, 255, 0))
+    volume_slider = Slider(50, 180, volume, 0.0, 1.0, slider_width, slider_height, slider_handle_radius)
+    # Click an action, then press its new key (Escape cancels)
+    key_buttons = {action: Button(binding_text(action), SCREEN_WIDTH // 2 - 150, 340 + i * 60, 300, 50, (0, 0, 150), (0, 0, 255))
+                   for i, action in enumerate(ACTIONS)}
+    rebinding = None
+
+    ui = UILayer(screen, intro_backdrop.frame(scroll))
+    volume_label = ui.add(Label(text_cache, small_font, "", (50, 150)))
+    ui.add(volume_slider)
+    ui.add(vibration_button)
+    for button in key_buttons.values():
+        ui.add(button)
+    ui.add(back_button)
 
     while current_state == SETTINGS:
-        screen.blit(background_img, (0, 0))
-        volume_text = small_font.render(f"Volume: {int(volume * 100)}%", True, (255, 255, 255))
-        screen.blit(volume_text, (50, 150))
-        volume = draw_slider(50, 180, volume, 0.0, 1.0)
-        pygame.mixer.music.set_volume(volume)
-        bullet_sound.set_volume(volume)
-        explosion_sound.set_volume(volume)
-        powerup_sound.set_volume(volume)
-        game_over_sound.set_volume(volume)
-        button_click_sound.set_volume(volume)
-        vibration_button.draw(screen)
-        back_button.draw(screen)
+        volume_label.text = f"Volume: {int(volume * 100)}%"
+        ui.refresh()
 
-        for event in pygame.event.get():
+        for event in ui.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 quit()
+            if rebinding is not None and event.type == pygame.KEYDOWN:
+                if event.key != pygame.K_ESCAPE:
+                    rebind(rebinding, event.key)
+                for action, button in key_buttons.items():
+                    button.text = binding_text(action)
+                rebinding = None
+                continue
+            if volume_slider.handle_event(event):
+                volume = volume_slider.value
+                audio.set_volume(volume)
             if event.type == pygame.MOUSEBUTTONDOWN:
                 mouse_pos = pygame.mouse.get_pos()
                 if vibration_button.check_click(mouse_pos):
                     vibration = not vibration
                     vibration_button.text = "Vibration: " + ("On" if vibration else "Off")
+                for action, button in key_buttons.items():
+                    if button.check_click(mouse_pos):
+                        if rebinding is not None:
+                            key_buttons[rebinding].text = binding_text(rebinding)
+                        rebinding = action
+                        button.text = f"{action.capitalize()}: press a key"
                 if back_button.check_click(mouse_pos):
                     current_state = MAIN_MENU
+            if event.type == pygame.MOUSEMOTION:
+                ui.hover(event.pos)
+
+ENEMY_COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255)]
+ENEMY_TYPES = ["fast", "tank", "shooter"]
+
+# Wave director tuning (see waves.WaveDirector); benchmark.py --wave overrides these for stress runs
+ENDLESS_WAVES = {
+    "budget_rate": 4, "budget_growth": 0.02, "max_budget_rate": 40, "max_enemies": 24,
+    "health": 5, "health_growth": 0.01,
+    "formations": ["scout", "gunner", "pair", "brute", "vee", "line", "column", "wall"],
+    "powerup_rate": POWERUP_SPAWN_RATE, "max_powerups": 1,
+    "meteor_rate": METEOR_SPAWN_RATE, "max_meteors": 1,
+}
+# Missions keep their fixed, respawning enemies and only get pickups from the director
+MISSION_WAVES = dict(ENDLESS_WAVES, formations=[])
+
+# The last finished run, replayable with `python replay.py data/last.replay`
+LAST_REPLAY_PATH = os.path.join(DATA_DIR, "last.replay")
+# Phase trace of the last profiled stretch of play, for chrome://tracing or Perfetto
+LAST_TRACE_PATH = os.path.join(DATA_DIR, "last_trace.json")
+
+
+def save_trace():
+    # Writes what the profiler traced, if anything, and starts it over
+    if profiler.trace:
+        profiler.export_trace(LAST_TRACE_PATH)
+    profiler.reset()
+
+# The run in progress, autosaved every AUTOSAVE_INTERVAL seconds of play and when leaving it from
+# the pause menu; the main menu offers to continue it
+SAVE_PATH = os.path.join(DATA_DIR, "session.save")
+AUTOSAVE_INTERVAL = 10
+autosaver = savegame.SaveWriter(SAVE_PATH)
+# Session left through the pause button, resumed by the pause screen
+paused_session = None
+
+# LAN play (see netplay): the host of this machine's runs, or how to join another machine's
+# (a function returning a new netplay.NetClient, so a dropped client can join again)
+net_host = None
+net_join = None
+
+# Session state saved by snapshot(), besides the entities, bullets, particles and RNG
+SNAPSHOT_FIELDS = ("player_x", "player_y", "prev_player_x", "prev_player_y", "player_health", "player_x_change",
+                   "player_y_change", "firing", "last_shot_time", "over", "result")
+
+# One run of the game: player, enemies, bullets, pickups and the fixed-timestep loop.
+# The rule set decides spawning, what progress means and how the run ends.
+# All randomness comes from the session seed, so a run is reproducible from its seed and inputs.
+class GameSession:
+    def __init__(self, rules, input_source=None, max_ticks=None, phases=NULL_TIMER, render=True, seed=None, ship=None,
+                 net=None):
+        # input_source, max_ticks, phases and render are used by the headless benchmark (benchmark.py) and replays:
+        # input_source(tick) returns that frame's events and the run returns stats instead of showing game over.
+        # net is a netplay.NetHost: its clients watch the run and one of them can fly a Wingman.
+        self.rules = rules
+        self.net = net
+        self.wingman = None
+        self.input_source = input_source
+        # Headless runs (benchmark, replays) leave money, achievements and save data alone
+        self.headless = input_source is not None
+        self.max_ticks = max_ticks
+        self.phases = phases
+        self.render = render
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        particles.seed(self.seed)
+        self.ship_index = current_spaceship if ship is None else ship
+        self.replay = Replay(self.seed, dict(rules.setup(), ship=self.ship_index))
+        self.director = WaveDirector(rules.waves, self.rng, SCREEN_WIDTH, ENEMY_COLORS)
+        self.backdrop = get_backdrop(rules.backdrop)
+
+        self.ship = spaceship_img(self.ship_index)
+        self.player_x = SCREEN_WIDTH // 2 - 40
+        self.player_y = SCREEN_HEIGHT - 120
+        self.prev_player_x = self.player_x
+        self.prev_player_y = self.player_y
+        self.player_speed = PLAYER_SPEED * (1.5 if self.ship_index == 0 else 1)
+        self.player_health = 3
+        self.max_health = 3 + (1 if self.ship_index == 2 else 0)
+        self.damage = 2 if self.ship_index != 1 else 4
+        self.effects = ActiveEffects(POWERUP_EFFECTS, FIRE_PATTERNS)
+        if self.ship_index == 4:
+            self.effects.apply("shield", 0)
+        self.player_x_change = 0
+        self.player_y_change = 0
+        self.player_rect = self.ship.get_rect(topleft=(self.player_x, self.player_y))
+        self.firing = False
+        self.last_shot_time = -FIRE_RATE
+        # Scripted and replayed input always uses the default keys
+        self.input = InputLayer(DEFAULT_BINDINGS if self.headless else key_bindings, poll_devices=not self.headless,
+                                latency=input_latency)
+
+        # Counters the rule sets track goals and achievements against
+        self.progress = {"enemies": 0, "powerups": 0, "time": 0, "meteors": 0, "score": 0}
+        self.over = False
+        self.result = None
+
+        self.bullets = BulletPool(SCREEN_WIDTH, SCREEN_HEIGHT, *assets.get("bullet").get_size())
+        self.bullet_rect = pygame.Rect(0, 0, self.bullets.hit_width, self.bullets.hit_height)
+        self.timestep = FixedTimestep(max_fps=max_fps, realtime=input_source is None)
+        self.collision_grid = SpatialHash()
+        self.pause_button = Button("Pause", SCREEN_WIDTH - 110, SCREEN_HEIGHT - 50, 100, 40, (150, 150, 150), (200, 200, 200))
+
+        enemies.clear()
+        powerups.clear()
+        meteors.clear()
+        particles.clear()
+        enemies.pool.reserve(rules.waves["max_enemies"] + 3, 0, 0, 1, ENEMY_COLORS[0])
+        rng = self.rng
+        for i in range(3):
+            enemies.spawn(rng.randint(0, SCREEN_WIDTH - 60), -50 - i * 300, rng.randint(1, 100), rng.choice(ENEMY_COLORS), rng.choice(ENEMY_TYPES))
+
+    def spawn_enemy(self):
+        rng = self.rng
+        enemies.spawn(rng.randint(0, SCREEN_WIDTH - 60), -50, 5, rng.choice(ENEMY_COLORS), rng.choice(ENEMY_TYPES))
+
+    def add_progress(self, key, amount=1):
+        self.progress[key] += amount
+        self.rules.progress(self, key)
+
+    def end(self, died):
+        self.over = True
+        self.finish_replay(died)
+        if self.phases is profiler:
+            save_trace()
+        if not self.headless:
+            # A finished run cannot be continued
+            autosaver.flush()
+            savegame.delete(SAVE_PATH)
+        if self.headless:
+            self.result = self.stats(died)
+        else:
+            self.rules.finish(self, died)
+
+    def finish_replay(self, died):
+        self.replay.result = self.stats(died)
+        # The second ship's inputs are not recorded, so co-op runs are neither replayed nor saved
+        if not self.headless and self.net is None:
+            self.replay.save(LAST_REPLAY_PATH)
+
+    def stats(self, died):
+        stats = {"ticks": self.timestep.ticks, "died": died}
+        stats.update(self.progress)
+        return stats
+
+    def frame(self):
+        # Handles one frame's input and runs the ticks that are due; True when the run should stop
+        timestep = self.timestep
+        timestep.begin_frame()
+        phases = self.phases
+        phases.begin()
+
+        events = self.input_source(timestep.ticks) if self.input_source else pygame.event.get()
+        for event in events:
+            self.handle_event(event)
+        net = self.net
+        if net is not None:
+            net.pump()
+        phases.lap("input")
+
+        while timestep.step():
+            self.apply_input(timestep.ticks - 1)
+            self.tick(timestep.dt)
+            if net is not None:
+                if timestep.ticks % net.send_interval == 0:
+                    net.publish(self.net_world(), self.progress["score"], timestep.time)
+            elif not self.headless and timestep.ticks % (AUTOSAVE_INTERVAL * TICK_RATE) == 0 and not self.over:
+                autosaver.submit(self.save_state())
+            if self.over:
+                return True
+            if self.max_ticks is not None and timestep.ticks >= self.max_ticks:
+                self.result = self.stats(False)
+                return True
+        return False
 
-        pygame.display.update()
-
-def game_loop():
-    global current_state, high_score, scroll, money, user_name, last_shot_time, achievements
-    player_x = SCREEN_WIDTH // 2 - 40
-    player_y = SCREEN_HEIGHT - 120
-    player_speed = 1.5 * (1.5 if current_spaceship == 0 else 1)
-    player_health = 3
-    player_boost = {"speed": False, "bullet": False, "speed_time": 0, "bullet_time": 0, "shield": current_spaceship == 4, 
-                    "shield_time": 0, "double": False, "double_time": 0, "triple": False, "triple_time": 0, 
-                    "ashoot": False, "ashoot_time": 0, "godmode": False, "godmode_time": 0, 
-                    "supermode": False, "supermode_time": 0}
-    player_x_change = 0
-    player_y_change = 0
-    player_rect = spaceships[current_spaceship].get_rect(topleft=(player_x, player_y))
-
-    colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255)]
-    enemy_types = ["fast", "tank", "shooter"]
-    enemies = [Enemy(random.randint(0, SCREEN_WIDTH - 60), -50 - i * 300, random.randint(1, 100), random.choice(colors), random.choice(enemy_types)) for i in range(3)]
-    bullets = []
-    score = 0
-    enemies_defeated = 0
-    meteors_dodged = 0
-    powerups_collected = 0
-    spawn_timer = 0
-    start_time = time.time()
-    powerups.clear()
-    meteors.clear()
-    particles.clear()
-
-    pause_button = Button("Pause", SCREEN_WIDTH - 110, SCREEN_HEIGHT - 50, 100, 40, (150, 150, 150), (200, 200, 200))
-    firing = False
-
-    while current_state == GAME:
-        screen.blit(background_img, (0, scroll))
-        screen.blit(background_img, (0, scroll - bg_height))
-        scroll = (scroll + 1) % bg_height
+    def run(self):
+        global paused_session
+        if profiler_overlay.visible and self.phases is NULL_TIMER:
+            self.phases = profiler
+            profiler.reset()
+        self.phases.mark("session")
+        while current_state == self.rules.state:
+            if self.frame():
+                return self.result
+            if self.render:
+                self.draw(self.timestep.alpha)
+            self.phases.end_frame()
+        # Left through the pause button
+        self.finish_replay(False)
+        paused_session = self
+
+    def resume(self):
+        global current_state
+        current_state = self.rules.state
+        # Keys held when the run was paused or saved are not held any more
+        self.input.release_all()
+        self.timestep.reset_clock()
+        return self.run()
+
+    def save_state(self):
+        return {"snapshot": self.snapshot(), "replay": self.replay.to_bytes()}
+
+    def snapshot(self):
+        # Everything the simulation needs to continue from this tick
+        snapshot = {field: getattr(self, field) for field in SNAPSHOT_FIELDS}
+        snapshot.update(
+            effects=self.effects.state(),
+            progress=dict(self.progress),
+            rng=self.rng.getstate(),
+            rules=dict(vars(self.rules)),
+            director=self.director.state(),
+            input=self.input.get_state(),
+            timestep=(self.timestep.time, self.timestep.ticks, self.timestep.accumulator),
+            scroll=scroll,
+            enemies=[(e.x, e.y, e.health, e.color, e.type, e.prev_y) for e in enemies],
+            powerups=[(p.x, p.y, p.type, p.prev_y) for p in powerups],
+            meteors=[(m.x, m.y, m.prev_y) for m in meteors],
+            bullets=self.bullets.state(),
+            particles=particles.state())
+        return snapshot
+
+    def restore(self, snapshot):
+        global scroll
+        for field in SNAPSHOT_FIELDS:
+            setattr(self, field, snapshot[field])
+        self.effects.load_state(snapshot["effects"])
+        self.progress = dict(snapshot["progress"])
+        self.rng.setstate(snapshot["rng"])
+        vars(self.rules).update(snapshot["rules"])
+        self.director.load_state(snapshot["director"])
+        self.input.load_state(snapshot["input"])
+        self.timestep.time, self.timestep.ticks, self.timestep.accumulator = snapshot["timestep"]
+        scroll = snapshot["scroll"]
+        self.player_rect.topleft = (self.player_x, self.player_y)
+        enemies.clear()
+        for x, y, health, color, type, prev_y in snapshot["enemies"]:
+            enemies.spawn(x, y, health, color, type).prev_y = prev_y
+        powerups.clear()
+        for x, y, type, prev_y in snapshot["powerups"]:
+            powerups.spawn(x, y, type).prev_y = prev_y
+        meteors.clear()
+        for x, y, prev_y in snapshot["meteors"]:
+            meteors.spawn(x, y).prev_y = prev_y
+        self.bullets.load_state(snapshot["bullets"])
+        particles.load_state(snapshot["particles"])
+
+    def handle_event(self, event):
+        global current_state
+        if self.input.handle_event(event):
+            return
+        if event.type == pygame.QUIT:
+            pygame.quit()
+            quit()
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            profiler_overlay.toggle()
+            if self.phases is NULL_TIMER or self.phases is profiler:
+                self.phases = profiler if profiler_overlay.visible else NULL_TIMER
+                if profiler_overlay.visible:
+                    profiler.reset()
+                else:
+                    save_trace()
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            if self.pause_button.check_click(pygame.mouse.get_pos()):
+                self.replay.record(self.timestep.ticks, PAUSE_ACTION)
+                current_state = PAUSED
+
+    def apply_input(self, tick):
+        # Samples the action state for this tick; the replay keeps only what changed
+        (left, right, up, down, fire), changes = self.input.sample()
+        for index, pressed in changes:
+            self.replay.record(tick, encode_action(index, pressed))
+        speed = self.player_speed * self.effects.speed
+        self.player_x_change = (right - left) * speed
+        self.player_y_change = (down - up) * speed
+        self.firing = fire
+
+    def fire(self, current_time):
+        effects = self.effects
+        bullet_x = self.player_x + self.ship.get_width() // 2 - assets.get("bullet").get_width() // 2
+        bullet_speed = BULLET_SPEED * max(1.5 if self.ship_index == 3 else 1, effects.bullet_speed)
+        offsets, angles = effects.fire_pattern
+        self.bullets.spawn(bullet_x + offsets, self.player_y, effects.big_bullets, bullet_speed, angles)
+        audio.play("bullet_sound")
+        self.last_shot_time = current_time
+
+    def fly_wingman(self, dt, current_time):
+        # Moves and fires the second ship with its client's input for this tick
+        peer = self.net.player
+        if peer is None:
+            self.wingman = None
+            return
+        if self.wingman is None or self.wingman.peer is not peer:
+            self.wingman = Wingman(peer)
+        wingman = self.wingman
+        state = self.net.next_input(peer)
+        wingman.update(state, dt)
+        if state[FIRE] and current_time - wingman.last_shot_time >= FIRE_RATE:
+            bullet_x = wingman.x + wingman.ship.get_width() // 2 - assets.get("bullet").get_width() // 2
+            self.bullets.spawn(bullet_x, wingman.y, False, BULLET_SPEED)
+            wingman.last_shot_time = current_time
+
+    def crash(self, enemy):
+        self.player_health -= 1
+        audio.play("explosion_sound")
+        particles.emit(enemy.x, enemy.y, enemy.color, 10)
+        self.collision_grid.remove(enemy)
+        enemies.remove(enemy)
+        if self.rules.respawn_enemies:
+            self.spawn_enemy()
+
+    def net_world(self):
+        # This tick's entities for the net clients, see netplay.COLLECTIONS
+        scale = netplay.POSITION_SCALE
+        players = [(0, round(self.player_x * scale), round(self.player_y * scale), self.player_health, self.ship_index,
+                    round(self.player_speed * self.effects.speed * scale))]
+        wingman = self.wingman
+        if wingman is not None:
+            players.append((1, round(wingman.x * scale), round(wingman.y * scale), self.player_health,
+                            wingman.ship_index, round(wingman.speed * scale)))
+        bullets = self.bullets
+        n = len(bullets)
+        return netplay.make_world(
+            players=players,
+            enemies=[(e.uid, round(e.x * scale), round(e.y * scale), e.health, ENEMY_COLORS.index(e.color),
+                      ENEMY_TYPES.index(e.type)) for e in enemies],
+            powerups=[(p.uid, round(p.x * scale), round(p.y * scale), POWERUP_TYPES.index(p.type)) for p in powerups],
+            meteors=[(m.uid, round(m.x * scale), round(m.y * scale)) for m in meteors],
+            bullets=netplay.bullet_rows(bullets.x[:n], bullets.y[:n], bullets.vx[:n], bullets.vy[:n],
+                                        bullets.angle[:n], bullets.big[:n]))
+
+    def collect(self, powerup, current_time):
+        effect = self.effects.apply(powerup.type, current_time)
+        if "heal" in effect:
+            self.player_health = min(self.max_health, self.player_health + effect["heal"])
+        show_notification(effect["notification"])
+        powerups.remove(powerup)
+        audio.play("powerup_sound")
+        self.add_progress("powerups")
+
+    def tick(self, dt):
+        global scroll
+        phases = self.phases
+        rules = self.rules
+        effects = self.effects
+        collision_grid = self.collision_grid
+        bullets = self.bullets
+        current_time = self.timestep.time
+        current_fire_rate = min(FIRE_RATE, effects.fire_rate)
+        scroll = (scroll + SCROLL_SPEED * dt) % self.backdrop.period
+
+        if self.firing and (current_time - self.last_shot_time >= current_fire_rate):
+            self.fire(current_time)
+        phases.lap("firing")
+
+        self.prev_player_x = self.player_x
+        self.prev_player_y = self.player_y
+        self.player_x = max(0, min(self.player_x + self.player_x_change * dt, SCREEN_WIDTH - self.ship.get_width()))
+        self.player_y = max(0, min(self.player_y + self.player_y_change * dt, SCREEN_HEIGHT - self.ship.get_height()))
+        self.player_rect.topleft = (self.player_x, self.player_y)
+        if self.net is not None:
+            self.fly_wingman(dt, current_time)
+
+        effects.expire(current_time)
+        phases.lap("player")
+
+        enemies.spawn_many(self.director.enemies(current_time, dt, len(enemies)))
+        phases.lap("spawn")
+
+        bullets.update(dt)
+        phases.lap("bullets")
+
+        for enemy in reversed(enemies):
+            enemy.update(dt)
+            if enemy.y > SCREEN_HEIGHT:
+                enemies.remove(enemy)
+                if rules.respawn_enemies:
+                    self.spawn_enemy()
+        phases.lap("enemies")
 
-        current_time = time.time()
-        elapsed_time = current_time - start_time
-        current_fire_rate = 0.05 if player_boost["supermode"] else FIRE_RATE
+        if self.director.powerup_due(current_time, len(powerups)):
+            powerups.spawn(self.rng.randint(0, SCREEN_WIDTH - 64), -50, self.rng.choice(POWERUP_TYPES))
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_LEFT:
-                    player_x_change = -player_speed * (2 if player_boost["speed"] or player_boost["supermode"] else 1)
-                if event.key == pygame.K_RIGHT:
-                    player_x_change = player_speed * (2 if player_boost["speed"] or player_boost["supermode"] else 1)
-                if event.key == pygame.K_UP:
-                    player_y_change = -player_speed * (2 if player_boost["speed"] or player_boost["supermode"] else 1)
-                if event.key == pygame.K_DOWN:
-                    player_y_change = player_speed * (2 if player_boost["speed"] or player_boost["supermode"] else 1)
-                if event.key == pygame.K_SPACE:
-                    firing = True
-            if event.type == pygame.KEYUP:
-                if event.key in (pygame.K_LEFT, pygame.K_RIGHT):
-                    player_x_change = 0
-                if event.key in (pygame.K_UP, pygame.K_DOWN):
-                    player_y_change = 0
-                if event.key == pygame.K_SPACE:
-                    firing = False
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                mouse_pos = pygame.mouse.get_pos()
-                if pause_button.check_click(mouse_pos):
-                    current_state = PAUSED
-
-        if firing and (current_time - last_shot_time >= current_fire_rate):
-            bullet_x = player_x + spaceships[current_spaceship].get_width() // 2 - bullet_img.get_width() // 2
-            bullet_speed = 0.7 * (1.5 if current_spaceship == 3 or player_boost["supermode"] else 1)
-            if player_boost["godmode"]:
-                for angle in range(0, 360, 30):
-                    bullets.append({"x": bullet_x, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": angle})
-            elif player_boost["ashoot"]:
-                for angle in [-30, -15, 0, 15, 30]:
-                    bullets.append({"x": bullet_x, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": angle})
-            elif player_boost["triple"] or player_boost["supermode"]:
-                bullets.append({"x": bullet_x - 20, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": 0})
-                bullets.append({"x": bullet_x, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": 0})
-                bullets.append({"x": bullet_x + 20, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": 0})
-            elif player_boost["double"]:
-                bullets.append({"x": bullet_x - 20, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": 0})
-                bullets.append({"x": bullet_x + 20, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": 0})
-            else:
-                bullets.append({"x": bullet_x, "y": player_y, "big": player_boost["bullet"], "speed": bullet_speed, "angle": 0})
-            bullet_sound.play()
-            last_shot_time = current_time
-
-        player_x = max(0, min(player_x + player_x_change, SCREEN_WIDTH - spaceships[current_spaceship].get_width()))
-        player_y = max(0, min(player_y + player_y_change, SCREEN_HEIGHT - spaceships[current_spaceship].get_height()))
-        player_rect.topleft = (player_x, player_y)
-
-        for key in ["speed", "bullet", "shield", "double", "triple", "ashoot", "godmode", "supermode"]:
-            if player_boost[key] and current_time - player_boost[f"{key}_time"] > 5:
-                player_boost[key] = False
-
-        spawn_timer += 1
-        if spawn_timer >= 60 and len(enemies) < 10:
-            type = random.choice(enemy_types)
-            enemies.append(Enemy(random.randint(0, SCREEN_WIDTH - 60), -50, 5, random.choice(colors), type))
-            spawn_timer = 0
-
-        for bullet in bullets[:]:
-            angle_rad = math.radians(bullet["angle"])
-            bullet["x"] += bullet["speed"] * math.sin(angle_rad)
-            bullet["y"] -= bullet["speed"] * math.cos(angle_rad)
-            fire_bullet(bullet["x"], bullet["y"], bullet["big"], bullet["angle"])
-            if bullet["y"] <= 0 or bullet["x"] < 0 or bullet["x"] > SCREEN_WIDTH:
-                bullets.remove(bullet)
-
-        for enemy in enemies[:]:
-            enemy.y += enemy.speed
-            enemy.draw(screen)
-            enemy_rect = pygame.Rect(enemy.x - enemy.radius, enemy.y - enemy.radius, enemy.radius * 2, enemy.radius * 2)
-            if rect_collision(player_rect, enemy_rect) and not player_boost["shield"]:
-                player_health -= 1
-                enemies.remove(enemy)
-                explosion_sound.play()
-                for _ in range(10):
-                    particles.append(Particle(enemy.x, enemy.y, enemy.color))
-            elif enemy.y > SCREEN_HEIGHT:
-                enemies.remove(enemy)
-                enemies.append(Enemy(random.randint(0, SCREEN_WIDTH - 60), -50, 5, random.choice(colors), random.choice(enemy_types)))
-
-        for bullet in bullets[:]:
-            for enemy in enemies[:]:
-                if rect_collision(pygame.Rect(bullet["x"], bullet["y"], bullet_img.get_width(), bullet_img.get_height()), 
-                                  pygame.Rect(enemy.x - enemy.radius, enemy.y - enemy.radius, enemy.radius * 2, enemy.radius * 2)):
-                    bullets.remove(bullet)
-                    enemy.health -= 2 if current_spaceship != 1 else 4
-                    if enemy.health <= 0:
-                        enemies.remove(enemy)
-                        enemies_defeated += 1
-                        score += 10
-                        money += 10
-                        for _ in range(10):
-                            particles.append(Particle(enemy.x, enemy.y, enemy.color))
-                    break
-
-        if not powerups and random.randint(1, 200) == 1:
-            powerup_type = random.choice(["speed", "health", "bullet", "double", "triple", "ashoot", "godmode", "supermode"])
-            powerups.append(PowerUp(random.randint(0, SCREEN_WIDTH - 64), -50, powerup_type))
-
-        for powerup in powerups[:]:
-            powerup.y += powerup.speed
-            powerup.rect.topleft = (powerup.x, powerup.y)
-            powerup.draw(screen)
-            if rect_collision(player_rect, powerup.rect):
-                if powerup.type == "speed":
-                    player_boost["speed"] = True
-                    player_boost["speed_time"] = time.time()
-                    show_notification("Speed Boost!")
-                elif powerup.type == "health":
-                    player_health = min(3 + (1 if current_spaceship == 2 else 0), player_health + 1)
-                    show_notification("Health Restored!")
-                elif powerup.type == "bullet":
-                    player_boost["bullet"] = True
-                    player_boost["bullet_time"] = time.time()
-                    show_notification("Big Bullets!")
-                elif powerup.type == "double":
-                    player_boost["double"] = True
-                    player_boost["double_time"] = time.time()
-                    show_notification("Double Shoot!")
-                elif powerup.type == "triple":
-                    player_boost["triple"] = True
-                    player_boost["triple_time"] = time.time()
-                    show_notification("Triple Shoot!")
-                elif powerup.type == "ashoot":
-                    player_boost["ashoot"] = True
-                    player_boost["ashoot_time"] = time.time()
-                    show_notification("A Shoot!")
-                elif powerup.type == "godmode":
-                    player_boost["godmode"] = True
-                    player_boost["godmode_time"] = time.time()
-                    show_notification("God Mode Shoot!")
-                elif powerup.type == "supermode":
-                    player_boost["supermode"] = True
-                    player_boost["supermode_time"] = time.time()
-                    show_notification("Super Mode Shoot!")
-                powerups.remove(powerup)
-                powerups_collected += 1
-                if powerups_collected >= 20 and not achievements["Power-Up Collector"]:
-                    achievements["Power-Up Collector"] = True
-                    show_notification("Achievement Unlocked: Power-Up Collector!")
-                powerup_sound.play()
-            elif powerup.y > SCREEN_HEIGHT:
+        for powerup in reversed(powerups):
+            powerup.update(dt)
+            if powerup.y > SCREEN_HEIGHT:
                 powerups.remove(powerup)
 
-        if not meteors and random.randint(1, 300) == 1:
-            meteors.append(Meteor(random.randint(0, SCREEN_WIDTH - 40), -50))
+        if self.director.meteor_due(current_time, len(meteors)):
+            meteors.spawn(self.rng.randint(0, SCREEN_WIDTH - 40), -50)
 
-        for meteor in meteors[:]:
-            meteor.y += meteor.speed
-            meteor.rect.topleft = (meteor.x, meteor.y)
-            meteor.draw(screen)
-            if rect_collision(player_rect, meteor.rect) and not player_boost["shield"]:
-                player_health -= 1
+        for meteor in reversed(meteors):
+            meteor.update(dt)
+            if meteor.y > SCREEN_HEIGHT:
                 meteors.remove(meteor)
-                explosion_sound.play()
-                for _ in range(10):
-                    particles.append(Particle(meteor.x, meteor.y, (150, 150, 150)))
-            elif meteor.y > SCREEN_HEIGHT:
+                self.add_progress("meteors")
+        phases.lap("pickups")
+
+        collision_grid.clear()
+        for enemy in enemies:
+            collision_grid.insert(enemy, enemy.rect, "enemy")
+        for powerup in powerups:
+            collision_grid.insert(powerup, powerup.rect, "powerup")
+        for meteor in meteors:
+            collision_grid.insert(meteor, meteor.rect, "meteor")
+
+        if not effects.shield:
+            for enemy in collision_grid.collisions(self.player_rect, "enemy"):
+                self.crash(enemy)
+            # The second ship shares the host's health and shield
+            if self.wingman is not None:
+                for enemy in collision_grid.collisions(self.wingman.rect, "enemy"):
+                    self.crash(enemy)
+
+        bullet_rect = self.bullet_rect
+        for i in bullets.hit_candidates(collision_grid):
+            bullet_rect.topleft = (int(bullets.x[i]), int(bullets.y[i]))
+            for enemy in collision_grid.collisions(bullet_rect, "enemy"):
+                bullets.kill(i)
+                enemy.health -= self.damage
+                if enemy.health <= 0:
+                    particles.emit(enemy.x, enemy.y, enemy.color, 10)
+                    collision_grid.remove(enemy)
+                    enemies.remove(enemy)
+                    if rules.respawn_enemies:
+                        self.spawn_enemy()
+                    self.add_progress("score", 10)
+                    self.add_progress("enemies")
+                break
+        bullets.compact()
+        phases.lap("collision")
+
+        for powerup in collision_grid.collisions(self.player_rect, "powerup"):
+            self.collect(powerup, current_time)
+        phases.lap("powerups")
+
+        if not effects.shield:
+            for meteor in collision_grid.collisions(self.player_rect, "meteor"):
+                self.player_health -= 1
+                audio.play("explosion_sound")
+                particles.emit(meteor.x, meteor.y, (150, 150, 150), 10)
                 meteors.remove(meteor)
-                meteors_dodged += 1
-                if meteors_dodged >= 10 and not achievements["Meteor Dodger"]:
-                    achievements["Meteor Dodger"] = True
-                    show_notification("Achievement Unlocked: Meteor Dodger!")
-
-        for particle in particles[:]:
-            particle.update()
-            particle.draw(screen)
-            if particle.lifetime <= 0:
-                particles.remove(particle)
-
-        screen.blit(spaceships[current_spaceship], (player_x, player_y))
-        show_score_health(score, player_health, elapsed_time)
-        pause_button.draw(screen)
+        phases.lap("meteors")
+
+        particles.update(dt)
+        phases.lap("particles")
+
+        self.progress["time"] = current_time
+        rules.progress(self, "time")
+        if self.player_health <= 0 and not self.over:
+            self.end(True)
+
+    def draw(self, alpha):
+        bullets = self.bullets
+        render_queue.set_layer(LAYER_BACKGROUND)
+        self.backdrop.draw(render_queue, scroll)
+        render_queue.set_layer(LAYER_BULLETS)
+        bullet_xs, bullet_ys = bullets.positions(alpha)
+        for i in range(len(bullets)):
+            fire_bullet(bullet_xs[i], bullet_ys[i], bullets.big[i], int(bullets.angle[i]))
+        render_queue.set_layer(LAYER_ENEMIES)
+        for enemy in enemies:
+            enemy.draw(render_queue, alpha)
+        render_queue.set_layer(LAYER_ENEMY_LABELS)
+        for enemy in enemies:
+            enemy.draw_label(render_queue, alpha)
+        render_queue.set_layer(LAYER_PICKUPS)
+        for powerup in powerups:
+            powerup.draw(render_queue, alpha)
+        for meteor in meteors:
+            meteor.draw(render_queue, alpha)
+        render_queue.set_layer(LAYER_PARTICLES)
+        particles.draw(render_queue, alpha)
+        render_queue.set_layer(LAYER_PLAYER)
+        render_queue.blit(self.ship, (lerp(self.prev_player_x, self.player_x, alpha), lerp(self.prev_player_y, self.player_y, alpha)))
+        if self.wingman is not None:
+            wingman = self.wingman
+            render_queue.blit(wingman.ship, (lerp(wingman.prev_x, wingman.x, alpha), lerp(wingman.prev_y, wingman.y, alpha)))
+        show_score_health(self.progress["score"], self.player_health, self.timestep.time)
+        self.rules.draw_hud(self)
+        render_queue.flush(screen)
+        self.phases.lap("render")
+        draw_health_bar(self.player_health, self.max_health)
+        self.pause_button.draw(screen)
         draw_notification()
+        if profiler_overlay.visible:
+            profiler_overlay.draw(screen, profiler, self.timestep.get_fps(), {
+                "bullets": len(bullets), "enemies": len(enemies), "powerups": len(powerups),
+                "meteors": len(meteors), "particles": len(particles),
+                "input_p95_ms": round(input_latency.percentiles()[95], 1)})
+        self.phases.lap("hud")
 
-        if player_health <= 0:
-            if score > high_score:
-                high_score = score
-                with open("high_score.json", "w") as file:
-                    json.dump(high_score, file)
-            leaderboard[user_name] = max(leaderboard.get(user_name, 0), score)
-            with open("leaderboard.json", "w") as file:
-                json.dump(leaderboard, file)
-            with open("achievements.json", "w") as file:
-                json.dump(achievements, file)
-            game_over_screen(score)
-            return
+        pygame.display.update()
+        self.input.presented()
+        self.phases.lap("present")
+
+# Endless mode: enemy waves from the wave director, money per kill, achievements, game over screen on death
+class EndlessRules:
+    state = GAME
+    respawn_enemies = False
+    backdrop = "endless"
+
+    def __init__(self, waves=ENDLESS_WAVES):
+        self.waves = waves
+
+    def setup(self):
+        return {"mode": "endless", "waves": self.waves}
 
-        if elapsed_time > 30 and not achievements["Speed Demon"]:
+    def progress(self, session, key):
+        global money
+        if session.headless:
+            return
+        value = session.progress[key]
+        if key == "enemies":
+            money += 10
+        elif key == "meteors" and value >= 10 and not achievements["Meteor Dodger"]:
+            achievements["Meteor Dodger"] = True
+            show_notification("Achievement Unlocked: Meteor Dodger!")
+        elif key == "powerups" and value >= 20 and not achievements["Power-Up Collector"]:
+            achievements["Power-Up Collector"] = True
+            show_notification("Achievement Unlocked: Power-Up Collector!")
+        elif key == "time" and value > 30 and not achievements["Speed Demon"]:
             achievements["Speed Demon"] = True
             show_notification("Achievement Unlocked: Speed Demon!")
 
+    def finish(self, session, died):
+        global high_score
+        score = session.progress["score"]
+        if score > high_score:
+            high_score = score
+            store.save_high_score(high_score)
+        if get_leaderboard(ENDLESS_BOARD).submit(user_name, score):
+            store.save_score(ENDLESS_BOARD, user_name, score)
+        store.save_achievements(achievements)
+        game_over_screen(score)
+
+    def draw_hud(self, session):
+        pass
+
+# Mission mode: a fixed set of enemies that respawn, the run ends when the mission goal is reached
+class MissionRules:
+    state = MISSION_MODE
+    respawn_enemies = True
+    backdrop = "mission"
+
+    waves = MISSION_WAVES
+
+    def __init__(self, mission_index):
+        self.mission_index = mission_index
+        self.mission = missions[mission_index]
+
+    def setup(self):
+        return {"mode": "mission", "mission": self.mission_index}
+
+    def progress(self, session, key):
+        if key == self.mission["goal"] and not session.over and session.progress[key] >= self.mission["target"]:
+            session.end(False)
+
+    def finish(self, session, died):
+        global current_state, money
+        mission = self.mission
+        if died:
+            show_notification("Mission Failed!")
+        else:
+            money += mission["reward"]
+            completed_missions.add(self.mission_index)
+            store.save_completed_mission(self.mission_index)
+            board = mission_board(self.mission_index)
+            if get_leaderboard(board).submit(user_name, session.progress["score"]):
+                store.save_score(board, user_name, session.progress["score"])
+            show_notification(f"Mission Completed! Reward: ${mission['reward']}")
+        current_state = MISSIONS
+
+    def draw_hud(self, session):
+        mission = self.mission
+        render_queue.blit(mission_label.render(mission["name"], int(session.progress[mission["goal"]]), mission["target"]), (10, 130))
+
+def game_loop(input_source=None, max_ticks=None, phases=NULL_TIMER, render=True, seed=None, waves=ENDLESS_WAVES, net=None):
+    return GameSession(EndlessRules(waves), input_source, max_ticks, phases, render, seed, net=net).run()
+
+def mission_mode(mission_index, input_source=None, max_ticks=None, phases=NULL_TIMER, render=True, seed=None, net=None):
+    global current_state
+    current_state = MISSION_MODE
+    return GameSession(MissionRules(mission_index), input_source, max_ticks, phases, render, seed, net=net).run()
+
+# Client end of a LAN run: draws the host's world as it arrives and flies the second ship with
+# prediction, or only watches (see netplay.NetClient)
+class RemoteSession:
+    def __init__(self, client):
+        self.client = client
+        self.timestep = FixedTimestep(max_fps=max_fps)
+        self.input = InputLayer(key_bindings, latency=input_latency)
+        self.backdrop = get_backdrop("endless")
+        self.leave_button = Button("Leave", SCREEN_WIDTH - 110, SCREEN_HEIGHT - 50, 100, 40, (150, 150, 150), (200, 200, 200))
+
+    def run(self):
+        global current_state, scroll
+        client = self.client
+        timestep = self.timestep
+        while current_state == NET_GAME:
+            timestep.begin_frame()
+            for event in pygame.event.get():
+                if self.input.handle_event(event):
+                    continue
+                if event.type == pygame.QUIT:
+                    client.close()
+                    pygame.quit()
+                    quit()
+                if event.type == pygame.MOUSEBUTTONDOWN and self.leave_button.check_click(pygame.mouse.get_pos()):
+                    current_state = MAIN_MENU
+            client.pump()
+            while timestep.step():
+                state, _ = self.input.sample()
+                client.tick(state)
+                scroll = (scroll + SCROLL_SPEED * timestep.dt) % self.backdrop.period
+            if client.closed:
+                show_notification("Disconnected from host")
+                current_state = MAIN_MENU
+            self.draw()
+        client.close()
+
+    def draw(self):
+        client = self.client
+        render_queue.set_layer(LAYER_BACKGROUND)
+        self.backdrop.draw(render_queue, scroll)
+        view = client.view()
+        if view is None:
+            render_queue.set_layer(LAYER_HUD)
+            waiting = text_cache.render(font, "Connecting..." if client.id is None else "Waiting for the host", (255, 255, 255))
+            render_queue.blit(waiting, (SCREEN_WIDTH // 2 - waiting.get_width() // 2, SCREEN_HEIGHT // 2))
+        else:
+            world, elapsed = view
+            render_queue.set_layer(LAYER_BULLETS)
+            for _, x, y, _, _, angle, big in world["bullets"]:
+                fire_bullet(x, y, big, int(angle))
+            # Same sprites and labels as Enemy, PowerUp and Meteor draw on the host
+            for _, x, y, health, color, type in world["enemies"]:
+                radius = ENEMY_RADII[ENEMY_TYPES[int(type)]]
+                render_queue.set_layer(LAYER_ENEMIES)
+                render_queue.blit(enemy_sprite(ENEMY_COLORS[int(color)], radius), (int(x) - radius, int(y) - radius))
+                render_queue.set_layer(LAYER_ENEMY_LABELS)
+                render_queue.blit(text_cache.render(font, f"{int(health)}", (255, 255, 255)), (x - 10, y - 40))
+            render_queue.set_layer(LAYER_PICKUPS)
+            for _, x, y, type in world["powerups"]:
+                render_queue.blit(assets.get(f"powerup_{POWERUP_TYPES[int(type)]}"), (x, y))
+            meteor_img = assets.get("meteor")
+            for _, x, y in world["meteors"]:
+                render_queue.blit(meteor_img, (x, y))
+            render_queue.set_layer(LAYER_PLAYER)
+            health = max_health = 3
+            for index, x, y, ship_health, ship, _ in world["players"]:
+                if index == 0:
+                    health = int(ship_health)
+                    max_health = 3 + (1 if ship == 2 else 0)
+                if index == 1 and client.role == netplay.PLAYER and client.position is not None:
+                    # Our own ship, where the inputs not yet applied by the host will take it
+                    x, y = client.position
+                render_queue.blit(spaceship_img(int(ship)), (x, y))
+            show_score_health(client.score, health, elapsed)
+        render_queue.flush(screen)
+        if view is not None:
+            draw_health_bar(health, max_health)
+        self.leave_button.draw(screen)
+        draw_notification()
         pygame.display.update()
+        self.input.presented()
+
+def setup_rules(setup):
+    # Rule set for a replay or save setup
+    if setup["mode"] == "mission":
+        return MissionRules(setup["mission"])
+    return EndlessRules(setup.get("waves", ENDLESS_WAVES))
+
+def replay_session(replay, phases=NULL_TIMER):
+    # Headless session that re-simulates a recorded run
+    return GameSession(setup_rules(replay.setup), replay.input_source(), phases=phases, render=False, seed=replay.seed,
+                       ship=replay.setup["ship"])
+
+def load_session(path=SAVE_PATH, net=None):
+    # Session continued from a save, None without a usable one
+    saved = savegame.load(path)
+    if saved is None:
+        return None
+    replay = Replay.from_bytes(saved["replay"])
+    session = GameSession(setup_rules(replay.setup), seed=replay.seed, ship=replay.setup["ship"], net=net)
+    session.replay = replay
+    session.restore(saved["snapshot"])
+    return session
 
 def shop_screen():
     global current_state, money, current_spaceship, owned_spaceships
@@ -996,18 +1487,19 @@ def shop_screen():
         buttons.append(Button(text, 350, 200 + i * 100, 150, 50, (0, 150, 0), (0, 255, 0)))
     back_button = Button("Back", 180, 750, 200, 50, (150, 0, 0), (255, 0, 0))
 
+    ui = UILayer(screen, intro_backdrop.frame(scroll))
+    for i, (img, btn) in enumerate(zip(map(spaceship_img, range(5)), buttons)):
+        ui.add(Image(img, (100, 200 + i * 100)))
+        ui.add(btn)
+        ui.add(Label(text_cache, small_font, spaceship_abilities[i], (200, 230 + i * 100)))
+    money_label = ui.add(Label(text_cache, font, "", (180, 150)))
+    ui.add(back_button)
+
     while current_state == SHOP:
-        screen.blit(background_img, (0, 0))
-        for i, (img, price, btn) in enumerate(zip(spaceships, spaceship_prices, buttons)):
-            screen.blit(img, (100, 200 + i * 100))
-            btn.draw(screen)
-            ability_text = small_font.render(spaceship_abilities[i], True, (255, 255, 255))
-            screen.blit(ability_text, (200, 230 + i * 100))
-        money_text = font.render(f"Money: ${money}", True, (255, 255, 255))
-        screen.blit(money_text, (180, 150))
-        back_button.draw(screen)
+        money_label.text = f"Money: ${money}"
+        ui.refresh()
 
-        for event in pygame.event.get():
+        for event in ui.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 quit()
@@ -1025,50 +1517,90 @@ def shop_screen():
                                 b.text = "Equip" if owned_spaceships[j] and j != current_spaceship else "Equipped" if j == current_spaceship else f"Buy ${spaceship_prices[j]}"
                 if back_button.check_click(pos):
                     current_state = MAIN_MENU
+            if event.type == pygame.MOUSEMOTION:
+                ui.hover(event.pos)
 
-        pygame.display.update()
+def mission_board(mission_index):
+    return f"mission{mission_index}"
+
+def get_leaderboard(board):
+    if board not in leaderboards:
+        leaderboards[board] = Leaderboard()
+    return leaderboards[board]
 
 def leaderboard_screen():
     global current_state
+    boards = [ENDLESS_BOARD] + [mission_board(i) for i in range(len(missions))]
+    board_titles = ["Endless"] + [mission["name"] for mission in missions]
+    board_index = 0
+    page = 0
+    shown = None
+    board_button = Button("Board", SCREEN_WIDTH // 2 - 100, 150, 200, 50, (0, 150, 150), (0, 255, 255))
+    prev_button = Button("<", 180, 620, 60, 50, (0, 0, 150), (0, 0, 255))
+    next_button = Button(">", 320, 620, 60, 50, (0, 0, 150), (0, 0, 255))
     back_button = Button("Back", 180, 700, 200, 50, (150, 0, 0), (255, 0, 0))
 
-    while current_state == LEADERBOARD:
-        screen.blit(background_img, (0, 0))
-        sorted_scores = sorted(leaderboard.items(), key=lambda x: x[1], reverse=True)[:5]
-        for i, (name, score) in enumerate(sorted_scores):
-            text = font.render(f"{i+1}. {name}: {score}", True, (255, 255, 255))
-            screen.blit(text, (180, 300 + i * 50))
-        back_button.draw(screen)
+    ui = UILayer(screen, intro_backdrop.frame(scroll))
+    ui.add(board_button)
+    board_label = ui.add(Label(text_cache, small_font, "", (SCREEN_WIDTH // 2, 230), center=True))
+    rows = [ui.add(Label(text_cache, font, "", (180, 300 + i * 50))) for i in range(LEADERBOARD_PAGE_SIZE)]
+    rank_label = ui.add(Label(text_cache, small_font, "", (SCREEN_WIDTH // 2, 570), center=True))
+    ui.add(prev_button)
+    ui.add(next_button)
+    ui.add(back_button)
 
-        for event in pygame.event.get():
+    while current_state == LEADERBOARD:
+        board = get_leaderboard(boards[board_index])
+        # Rows are only rebuilt when the board, the page or the scores change
+        if shown != (board_index, page, board.version):
+            shown = (board_index, page, board.version)
+            entries = board.page(page * LEADERBOARD_PAGE_SIZE, LEADERBOARD_PAGE_SIZE)
+            for i, row in enumerate(rows):
+                row.text = f"{entries[i][0]}. {entries[i][1]}: {entries[i][2]}" if i < len(entries) else ""
+            board_label.text = board_titles[board_index]
+            rank = board.rank(user_name)
+            rank_label.text = f"Your rank: {rank} of {len(board)}" if rank else f"{len(board)} players"
+            prev_button.visible = page > 0
+            next_button.visible = (page + 1) * LEADERBOARD_PAGE_SIZE < len(board)
+        ui.refresh()
+
+        for event in ui.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 quit()
             if event.type == pygame.MOUSEBUTTONDOWN:
-                if back_button.check_click(pygame.mouse.get_pos()):
+                pos = pygame.mouse.get_pos()
+                if board_button.check_click(pos):
+                    board_index = (board_index + 1) % len(boards)
+                    page = 0
+                elif prev_button.visible and prev_button.check_click(pos):
+                    page -= 1
+                elif next_button.visible and next_button.check_click(pos):
+                    page += 1
+                elif back_button.check_click(pos):
                     current_state = MAIN_MENU
-
-        pygame.display.update()
+            if event.type == pygame.MOUSEMOTION:
+                ui.hover(event.pos)
 
 def game_over_screen(score):
     global current_state
     replay_button = Button("Replay", SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 + 150, 200, 50, (0, 150, 0), (0, 255, 0))
     menu_button = Button("Menu", SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 + 220, 200, 50, (150, 0, 0), (255, 0, 0))
     game_over_y = SCREEN_HEIGHT // 2 - 150
+    game_over_img = assets.get("game_over")
     game_over_x = SCREEN_WIDTH // 2 - game_over_img.get_width() // 2
     animation_offset = math.sin(time.time() * 5) * 15
 
+    ui = UILayer(screen, game_over_background)
+    ui.add(Label(text_cache, font, f"Final Score: {score}", (SCREEN_WIDTH // 2, game_over_y - 50), center=True))
+    ui.add(Image(game_over_img, (game_over_x, int(game_over_y + animation_offset))))
+    ui.add(replay_button)
+    ui.add(menu_button)
+
     while True:
-        screen.blit(background_img, (0, 0))
-        pygame.draw.rect(screen, (0, 0, 0, 180), (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT))
-        score_text = font.render(f"Final Score: {score}", True, (255, 255, 255))
-        screen.blit(score_text, (SCREEN_WIDTH // 2 - score_text.get_width() // 2, game_over_y - 50))
-        screen.blit(game_over_img, (game_over_x, game_over_y + animation_offset))
-        
-        replay_button.draw(screen)
-        menu_button.draw(screen)
+        ui.refresh()
 
-        for event in pygame.event.get():
+        for event in ui.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 quit()
@@ -1080,54 +1612,108 @@ def game_over_screen(score):
                 elif menu_button.check_click(pos):
                     current_state = MAIN_MENU
                     return
-
-        pygame.display.update()
+            if event.type == pygame.MOUSEMOTION:
+                ui.hover(event.pos)
 
 def pause_screen():
-    global current_state
+    global current_state, paused_session
     resume_button = Button("Resume", SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 - 50, 200, 50, (0, 150, 0), (0, 255, 0))
     menu_button = Button("Menu", SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 + 10, 200, 50, (150, 0, 0), (255, 0, 0))
 
+    ui = UILayer(screen, intro_backdrop.frame(scroll))
+    ui.add(resume_button)
+    ui.add(menu_button)
+
     while current_state == PAUSED:
-        screen.blit(background_img, (0, 0))
-        resume_button.draw(screen)
-        menu_button.draw(screen)
+        ui.refresh()
 
-        for event in pygame.event.get():
+        for event in ui.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 quit()
             if event.type == pygame.MOUSEBUTTONDOWN:
                 pos = pygame.mouse.get_pos()
                 if resume_button.check_click(pos):
-                    current_state = GAME if previous_state == GAME else MISSION_MODE
+                    current_state = paused_session.rules.state
                 elif menu_button.check_click(pos):
+                    # Kept on disk, the main menu offers to continue it
+                    autosaver.flush()
+                    if paused_session.net is None:
+                        savegame.save(SAVE_PATH, paused_session.save_state())
+                    paused_session = None
                     current_state = MAIN_MENU
-
-        pygame.display.update()
+            if event.type == pygame.MOUSEMOTION:
+                ui.hover(event.pos)
 
 # Main game loop
-previous_state = None
-while True:
-    if current_state == INTRO:
-        intro_animation()
-    elif current_state == MAIN_MENU:
-        main_menu()
-    elif current_state == SETTINGS:
-        settings_screen()
-    elif current_state == GAME:
-        previous_state = GAME
-        game_loop()
-    elif current_state == PAUSED:
-        pause_screen()
-    elif current_state == SHOP:
-        shop_screen()
-    elif current_state == LEADERBOARD:
-        leaderboard_screen()
-    elif current_state == MISSIONS:
-        missions_screen()
-    elif current_state == MISSION_MODE:
-        previous_state = MISSION_MODE
-        mission_mode(0)
-    elif current_state == HOW_TO_PLAY:
-        how_to_play_screen()
\ No newline at end of file
+def main():
+    global current_state, paused_session
+    pygame.mixer.music.load(os.path.join(DATA_DIR, "background_music.mp3"))
+    pygame.mixer.music.play(-1)
+    audio.set_volume(volume)
+    assets.preload()
+    if net_host is not None:
+        UILayer.pollers.append(net_host.pump)
+    if net_join is not None:
+        current_state = NET_GAME
+    while True:
+        if current_state == INTRO:
+            intro_animation()
+        elif current_state == MAIN_MENU:
+            main_menu()
+        elif current_state == SETTINGS:
+            settings_screen()
+        elif current_state == GAME:
+            if paused_session is not None:
+                session, paused_session = paused_session, None
+                session.resume()
+            else:
+                game_loop(net=net_host)
+        elif current_state == PAUSED:
+            pause_screen()
+        elif current_state == SHOP:
+            shop_screen()
+        elif current_state == LEADERBOARD:
+            leaderboard_screen()
+        elif current_state == MISSIONS:
+            missions_screen()
+        elif current_state == MISSION_MODE:
+            if paused_session is not None:
+                session, paused_session = paused_session, None
+                session.resume()
+            else:
+                mission_mode(0, net=net_host)
+        elif current_state == HOW_TO_PLAY:
+            how_to_play_screen()
+        elif current_state == NET_GAME:
+            RemoteSession(net_join()).run()
+
+def net_address(text):
+    host, _, port = text.partition(":")
+    return host, int(port or netplay.NET_PORT)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Space Wars")
+    lan = parser.add_mutually_exclusive_group()
+    lan.add_argument("--host", nargs="?", const=netplay.NET_PORT, type=int, metavar="PORT",
+                     help="let LAN players join endless runs, one as a second ship")
+    lan.add_argument("--join", type=net_address, metavar="HOST[:PORT]", help="fly the second ship in a host's run")
+    lan.add_argument("--spectate", type=net_address, metavar="HOST[:PORT]", help="watch a host's run")
+    # Simulated network conditions, for trying LAN play over localhost
+    parser.add_argument("--latency", type=float, default=0.0, help="added one-way latency in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency in ms")
+    parser.add_argument("--loss", type=float, default=0.0, help="share of packets dropped, 0..1")
+    args = parser.parse_args()
+    conditioner = None
+    if args.latency or args.jitter or args.loss:
+        conditioner = netplay.LinkConditioner(args.latency / 1000, args.jitter / 1000, args.loss)
+    if args.host is not None:
+        net_host = netplay.NetHost(("0.0.0.0", args.host), TICK_RATE, len(spaceship_prices), conditioner=conditioner)
+    elif args.join or args.spectate:
+        ship = spaceship_img(current_spaceship)
+        net_join = lambda: netplay.NetClient(args.join or args.spectate, netplay.PLAYER if args.join else netplay.SPECTATOR,
+                                             current_spaceship, (SCREEN_WIDTH - ship.get_width(), SCREEN_HEIGHT - ship.get_height()),
+                                             conditioner=conditioner)
+        user_name = user_name or "guest"
+    main()
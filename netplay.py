@@ -0,0 +1,568 @@
+# LAN co-op and spectating. The host runs the only simulation and streams its entities to the
+# clients over UDP. A client draws what it receives; the one flying the second ship also predicts
+# that ship from its own inputs until the host's state catches up.
+#
+# States go out SEND_RATE times a second. Each is delta-encoded against the last state that client
+# acknowledged: rows already present in that state only carry the change. Clients draw
+# INTERP_DELAY behind the newest state, interpolating between the two states around that time.
+# Every input packet repeats the previous few inputs, so a lost packet costs nothing.
+#
+#     python main.py --host                          # host; start a run from the menu
+#     python main.py --join 192.168.1.20             # fly the second ship
+#     python main.py --spectate 192.168.1.20
+#     python benchmark.py --net --latency 80 --loss 0.05   # host and client over localhost
+import asyncio
+import heapq
+import math
+import random
+import socket
+import struct
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+NET_PORT = 50007
+SEND_RATE = 30
+INTERP_DELAY = 0.1
+INPUT_REDUNDANCY = 8
+# Inputs the host may queue for a ship before it skips ahead, bounding the second player's lag
+MAX_INPUT_BACKLOG = 12
+# Peers that stay silent this long are dropped
+TIMEOUT = 5.0
+# While no states go out (host paused or between runs) clients get a WELCOME this often instead
+KEEPALIVE_INTERVAL = 1.0
+HELLO_INTERVAL = 0.5
+# Simulation rates a client accepts in a WELCOME
+MAX_TICK_RATE = 1000
+# Positions travel as integers in 1/POSITION_SCALE pixels
+POSITION_SCALE = 8
+# States kept to delta-encode against (host) and to decode deltas with (client)
+HISTORY = 64
+
+# Columns per entity row. The first is the key rows are matched on between states.
+#   players   index (0 host, 1 second ship), x, y, health, ship, speed
+#   enemies   id, x, y, health, color index, type index
+#   powerups  id, x, y, type index
+#   meteors   id, x, y
+#   bullets   slot, x, y, vx, vy, angle, big
+COLLECTIONS = {"players": 6, "enemies": 6, "powerups": 4, "meteors": 3, "bullets": 7}
+# Bullets are not interpolated; they move in straight lines and are extrapolated from their velocity
+INTERPOLATED = ("players", "enemies", "powerups", "meteors")
+
+HELLO, WELCOME, INPUT, STATE, BYE = range(1, 6)
+PLAYER, SPECTATOR = 0, 1
+
+# kind, role, ship
+_HELLO = struct.Struct("<BBB")
+# kind, peer id, role, tick rate
+_WELCOME = struct.Struct("<BHBH")
+# kind, acknowledged state, input count; (input sequence, action bits) rows follow
+_INPUT = struct.Struct("<BIB")
+_INPUT_ROW = struct.Struct("<IB")
+# kind, state sequence, baseline sequence (0 for a full state), last input applied, score, time; delta follows
+_STATE = struct.Struct("<BIIIIf")
+_KIND = struct.Struct("<B")
+_COUNT = struct.Struct("<H")
+
+
+def action_bits(state):
+    return sum(1 << i for i, pressed in enumerate(state) if pressed)
+
+
+def action_state(bits, count=5):
+    return tuple(bool(bits >> i & 1) for i in range(count))
+
+
+def move_ship(x, y, state, speed, dt, max_x, max_y):
+    # Ship movement for one tick, shared by the host and the client's prediction
+    left, right, up, down = state[:4]
+    return (max(0, min(x + (right - left) * speed * dt, max_x)),
+            max(0, min(y + (down - up) * speed * dt, max_y)))
+
+
+def make_world(**rows):
+    # Collection name -> int32 rows; collections left out are empty
+    return {name: np.asarray(rows.get(name, ()), dtype=np.int32).reshape(-1, columns)
+            for name, columns in COLLECTIONS.items()}
+
+
+def bullet_rows(x, y, vx, vy, angle, big):
+    # Bullet rows from the live part of the BulletPool arrays, keyed by slot
+    scale = POSITION_SCALE
+    return np.column_stack((np.arange(len(x)), np.rint(x * scale), np.rint(y * scale), np.rint(vx), np.rint(vy), angle, big))
+
+
+def _match(base, keys):
+    # (mask of keys found in base, their row indices in base)
+    if not len(base) or not len(keys):
+        return np.zeros(len(keys), dtype=bool), np.zeros(len(keys), dtype=np.intp)
+    order = np.argsort(base[:, 0], kind="stable")
+    sorted_keys = base[order, 0]
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return sorted_keys[pos] == keys, order[pos]
+
+
+def encode_delta(world, baseline=None):
+    # Per collection: row count, a bit per row that is in the baseline, then the rows with the
+    # baseline values subtracted from those. Mostly zeros and small steps, which compress well.
+    parts = []
+    for name in COLLECTIONS:
+        rows = world[name]
+        out = rows.copy()
+        matched = np.zeros(len(rows), dtype=bool)
+        if baseline is not None:
+            matched, index = _match(baseline[name], rows[:, 0])
+            out[matched, 1:] -= baseline[name][index[matched], 1:]
+        parts.append(_COUNT.pack(len(rows)))
+        parts.append(np.packbits(matched).tobytes())
+        parts.append(out.tobytes())
+    return zlib.compress(b"".join(parts), 1)
+
+
+def decode_delta(data, baseline=None):
+    body = zlib.decompress(data)
+    world = {}
+    offset = 0
+    for name, columns in COLLECTIONS.items():
+        (count,) = _COUNT.unpack_from(body, offset)
+        offset += _COUNT.size
+        flag_bytes = (count + 7) // 8
+        matched = np.unpackbits(np.frombuffer(body, np.uint8, flag_bytes, offset), count=count).astype(bool)
+        offset += flag_bytes
+        rows = np.frombuffer(body, np.int32, count * columns, offset).reshape(count, columns).copy()
+        offset += count * columns * 4
+        if matched.any():
+            if baseline is None:
+                raise ValueError("delta state without its baseline")
+            found, index = _match(baseline[name], rows[matched, 0])
+            if not found.all():
+                raise ValueError("delta row missing from its baseline")
+            rows[matched, 1:] += baseline[name][index, 1:]
+        world[name] = rows
+    return world
+
+
+def interpolate(older, newer, t, since_older):
+    # World to draw, t of the way from older to newer (positions in pixels, as floats). Bullets
+    # come from the older state, moved on by since_older seconds.
+    view = {}
+    for name in INTERPOLATED:
+        rows = newer[name].astype(float)
+        if t < 1:
+            matched, index = _match(older[name], newer[name][:, 0])
+            previous = older[name][index[matched], 1:3]
+            rows[matched, 1:3] = previous + (rows[matched, 1:3] - previous) * t
+        rows[:, 1:3] /= POSITION_SCALE
+        view[name] = rows
+    bullets = older["bullets"].astype(float)
+    bullets[:, 1:3] = bullets[:, 1:3] / POSITION_SCALE + bullets[:, 3:5] * since_older
+    view["bullets"] = bullets
+    return view
+
+
+# Simulated network for testing over localhost: every outgoing packet is held back by latency plus
+# up to jitter seconds (so packets can also arrive out of order), and a share of them is dropped
+class LinkConditioner:
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.queue = []
+        self.order = 0
+        self.dropped = 0
+
+    def send(self, data, address, now):
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        due = now + self.latency + self.rng.random() * self.jitter
+        heapq.heappush(self.queue, (due, self.order, data, address))
+        self.order += 1
+
+    def release(self, transport, now):
+        queue = self.queue
+        while queue and queue[0][0] <= now:
+            _, _, data, address = heapq.heappop(queue)
+            transport.sendto(data, address)
+
+
+# UDP socket on an asyncio event loop that the game steps from its own loop (pump() once per frame)
+# rather than handing control to asyncio. Endpoints can share a loop, e.g. a host and a client in
+# one process.
+class _Endpoint(asyncio.DatagramProtocol):
+    def __init__(self, local_address, conditioner=None, loop=None, clock=time.perf_counter):
+        self.own_loop = loop is None
+        self.loop = asyncio.new_event_loop() if loop is None else loop
+        self.conditioner = conditioner
+        self.clock = clock
+        self.inbox = deque()
+        self.transport = None
+        self.started = clock()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.packets_sent = 0
+        self.packets_received = 0
+        self.malformed = 0
+        self.loop.run_until_complete(self.loop.create_datagram_endpoint(lambda: self, local_addr=local_address))
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        self.inbox.append((data, address))
+
+    def error_received(self, error):
+        # ICMP errors (e.g. port unreachable once the other side is gone), silence times the peer out
+        pass
+
+    @property
+    def address(self):
+        return self.transport.get_extra_info("sockname")
+
+    def send(self, data, address):
+        self.packets_sent += 1
+        self.bytes_sent += len(data)
+        if self.conditioner is not None:
+            self.conditioner.send(data, address, self.clock())
+        else:
+            self.transport.sendto(data, address)
+
+    def pump(self):
+        # Runs the socket I/O that is due and handles what arrived
+        now = self.clock()
+        if self.conditioner is not None:
+            self.conditioner.release(self.transport, now)
+        # A loop iteration reads one datagram per socket, keep going while more arrive
+        for _ in range(256):
+            waiting = len(self.inbox)
+            self.loop.call_soon(self.loop.stop)
+            self.loop.run_forever()
+            if len(self.inbox) == waiting:
+                break
+        while self.inbox:
+            data, address = self.inbox.popleft()
+            self.packets_received += 1
+            self.bytes_received += len(data)
+            try:
+                self.receive(data, address, now)
+            except (struct.error, ValueError, KeyError, IndexError, zlib.error):
+                self.malformed += 1
+        self.update(now)
+
+    def receive(self, data, address, now):
+        pass
+
+    def update(self, now):
+        pass
+
+    def traffic(self):
+        elapsed = max(1e-9, self.clock() - self.started)
+        return {
+            "bytes_sent": self.bytes_sent, "bytes_received": self.bytes_received,
+            "packets_sent": self.packets_sent, "packets_received": self.packets_received,
+            "kbps_sent": self.bytes_sent * 8 / 1000 / elapsed, "kbps_received": self.bytes_received * 8 / 1000 / elapsed,
+            "dropped": self.conditioner.dropped if self.conditioner is not None else 0, "malformed": self.malformed,
+        }
+
+    def close(self):
+        if self.conditioner is not None:
+            # Whatever is still in flight goes out now
+            self.conditioner.release(self.transport, math.inf)
+        self.transport.close()
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+        if self.own_loop:
+            self.loop.close()
+
+
+class _Peer:
+    def __init__(self, id, address, role, ship, now):
+        self.id = id
+        self.address = address
+        self.role = role
+        self.ship = ship
+        self.last_seen = now
+        self.last_sent = now
+        # Newest state the peer has, the baseline for the next one
+        self.acked = 0
+        # Input sequence -> action bits, waiting for their tick
+        self.inputs = {}
+        self.processed = 0
+        self.bits = 0
+
+
+# Host side: accepts clients, hands the second player's inputs to the simulation one per tick and
+# sends every client the world each send_interval ticks. ships is how many ships a client may pick from.
+class NetHost(_Endpoint):
+    def __init__(self, address=("0.0.0.0", NET_PORT), tick_rate=120, ships=5, **options):
+        super().__init__(address, **options)
+        self.tick_rate = tick_rate
+        self.ships = ships
+        self.send_interval = max(1, tick_rate // SEND_RATE)
+        self.peers = {}
+        self.next_id = 1
+        # Sequence numbers run across sessions, so a baseline from an earlier run is never mistaken for one from this run
+        self.sequence = 0
+        self.history = {}
+        self.states_sent = 0
+        self.full_states = 0
+        self.state_bytes = 0
+
+    @property
+    def player(self):
+        # Peer flying the second ship, None without one
+        return next((peer for peer in self.peers.values() if peer.role == PLAYER), None)
+
+    def receive(self, data, address, now):
+        kind = data[0]
+        peer = self.peers.get(address)
+        if kind == HELLO:
+            _, role, ship = _HELLO.unpack_from(data)
+            if role not in (PLAYER, SPECTATOR) or ship >= self.ships:
+                raise ValueError(f"bad HELLO (role {role}, ship {ship})")
+            if peer is None:
+                if role == PLAYER and self.player is not None:
+                    role = SPECTATOR
+                peer = _Peer(self.next_id, address, role, ship, now)
+                self.next_id += 1
+                self.peers[address] = peer
+            # Answered every time, the previous answer may have been lost
+            self.send(_WELCOME.pack(WELCOME, peer.id, peer.role, self.tick_rate), address)
+        elif peer is None:
+            return
+        elif kind == INPUT:
+            _, acked, count = _INPUT.unpack_from(data)
+            if acked in self.history and acked > peer.acked:
+                peer.acked = acked
+            for i in range(count):
+                sequence, bits = _INPUT_ROW.unpack_from(data, _INPUT.size + i * _INPUT_ROW.size)
+                if sequence > peer.processed:
+                    peer.inputs[sequence] = bits
+        elif kind == BYE:
+            del self.peers[address]
+            return
+        peer.last_seen = now
+
+    def update(self, now):
+        for address in [address for address, peer in self.peers.items() if now - peer.last_seen > TIMEOUT]:
+            del self.peers[address]
+        for peer in self.peers.values():
+            if now - peer.last_sent > KEEPALIVE_INTERVAL:
+                self.send(_WELCOME.pack(WELCOME, peer.id, peer.role, self.tick_rate), peer.address)
+                peer.last_sent = now
+
+    def next_input(self, peer):
+        # Action bits for the peer's ship this tick; the last input repeats while the next one is late
+        inputs = peer.inputs
+        if len(inputs) > MAX_INPUT_BACKLOG:
+            # Fell behind (e.g. after a stall): jump to the newest few
+            newest = sorted(inputs)[-MAX_INPUT_BACKLOG // 2:]
+            peer.processed = newest[0] - 1
+            peer.inputs = inputs = {sequence: inputs[sequence] for sequence in newest}
+        sequence = peer.processed + 1
+        if sequence not in inputs and inputs and min(inputs) > sequence:
+            # Lost for good (beyond INPUT_REDUNDANCY)
+            sequence = min(inputs)
+        bits = inputs.pop(sequence, None)
+        if bits is not None:
+            peer.processed = sequence
+            peer.bits = bits
+        return action_state(peer.bits)
+
+    def publish(self, world, score, elapsed):
+        now = self.clock()
+        self.sequence += 1
+        self.history[self.sequence] = world
+        self.history.pop(self.sequence - HISTORY, None)
+        for peer in self.peers.values():
+            baseline = self.history.get(peer.acked)
+            base = peer.acked if baseline is not None else 0
+            packet = _STATE.pack(STATE, self.sequence, base, peer.processed, score, elapsed) + encode_delta(world, baseline)
+            self.send(packet, peer.address)
+            peer.last_sent = now
+            self.states_sent += 1
+            self.full_states += base == 0
+            self.state_bytes += len(packet)
+
+    def stats(self):
+        stats = self.traffic()
+        stats.update(peers=len(self.peers), states_sent=self.states_sent, full_states=self.full_states,
+                     mean_state_bytes=self.state_bytes / self.states_sent if self.states_sent else 0.0)
+        return stats
+
+    def close(self):
+        for peer in self.peers.values():
+            self.send(_KIND.pack(BYE), peer.address)
+        super().close()
+
+
+# Client side: joins a host as the second ship (PLAYER) or as a SPECTATOR. tick() sends the
+# local input every simulation tick, view() gives the interpolated world to draw and position
+# the predicted ship.
+class NetClient(_Endpoint):
+    def __init__(self, host_address, role=PLAYER, ship=0, bounds=(0, 0), **options):
+        super().__init__(("0.0.0.0", 0), **options)
+        # Resolved, so replies can be matched against the address they come from
+        self.host = (socket.gethostbyname(host_address[0]), host_address[1])
+        self.role = role
+        self.ship = ship
+        # Largest x and y the ship may take, as on the host
+        self.bounds = bounds
+        self.id = None
+        self.dt = None
+        self.closed = False
+        self.last_hello = -math.inf
+        self.last_heard = self.started
+        # Sequence -> world, to decode deltas against
+        self.states = {}
+        self.latest = 0
+        # (host time, world) of the newest states, for interpolation
+        self.timeline = deque(maxlen=SEND_RATE)
+        # Host time minus local clock, smoothed
+        self.offset = None
+        self.score = 0
+        self.sequence = 0
+        self.unacked = deque(maxlen=4 * MAX_INPUT_BACKLOG)
+        self.position = None
+        self.speed = 0.0
+        self.intervals = deque(maxlen=240)
+        self.last_state_at = None
+        self.states_received = 0
+        self.full_states = 0
+        self.undecodable = 0
+        self.held_frames = 0
+        self.corrections = 0
+        self.correction_px = 0.0
+
+    @property
+    def connected(self):
+        return self.id is not None and not self.closed
+
+    def receive(self, data, address, now):
+        if address[:2] != self.host:
+            return
+        self.last_heard = now
+        kind = data[0]
+        if kind == WELCOME:
+            _, peer_id, role, tick_rate = _WELCOME.unpack_from(data)
+            if role not in (PLAYER, SPECTATOR) or not 0 < tick_rate <= MAX_TICK_RATE:
+                raise ValueError(f"bad WELCOME (role {role}, tick rate {tick_rate})")
+            self.id, self.role = peer_id, role
+            self.dt = 1.0 / tick_rate
+        elif kind == STATE and self.id is not None:
+            self.receive_state(data, now)
+        elif kind == BYE:
+            self.closed = True
+
+    def receive_state(self, data, now):
+        _, sequence, base, processed, score, elapsed = _STATE.unpack_from(data)
+        if sequence <= self.latest:
+            # Late or duplicate
+            return
+        baseline = None
+        if base:
+            baseline = self.states.get(base)
+            if baseline is None:
+                self.undecodable += 1
+                return
+        else:
+            self.full_states += 1
+        world = decode_delta(data[_STATE.size:], baseline)
+        self.states[sequence] = world
+        self.states_received += 1
+        self.states.pop(sequence - HISTORY, None)
+        self.latest = sequence
+        if self.last_state_at is not None:
+            self.intervals.append((now - self.last_state_at) * 1000)
+        self.last_state_at = now
+        sample = elapsed - now
+        if self.timeline and elapsed < self.timeline[-1][0] or self.offset is None or abs(sample - self.offset) > 1:
+            # First state, or the host started a new run
+            self.timeline.clear()
+            self.offset = sample
+        else:
+            self.offset += (sample - self.offset) * 0.05
+        self.timeline.append((elapsed, world))
+        self.score = score
+        if self.role == PLAYER:
+            self.reconcile(world, processed)
+
+    def reconcile(self, world, processed):
+        # Host position of the ship, then the inputs it has not applied yet replayed on top
+        rows = world["players"]
+        rows = rows[rows[:, 0] == 1]
+        if not len(rows):
+            self.position = None
+            return
+        while self.unacked and self.unacked[0][0] <= processed:
+            self.unacked.popleft()
+        x, y = rows[0, 1] / POSITION_SCALE, rows[0, 2] / POSITION_SCALE
+        self.speed = rows[0, 5] / POSITION_SCALE
+        for _, state in self.unacked:
+            x, y = move_ship(x, y, state, self.speed, self.dt, *self.bounds)
+        if self.position is not None:
+            error = math.hypot(x - self.position[0], y - self.position[1])
+            if error > 0.5:
+                self.corrections += 1
+                self.correction_px += error
+        self.position = (x, y)
+
+    def update(self, now):
+        if self.id is None and now - self.last_hello >= HELLO_INTERVAL:
+            self.send(_HELLO.pack(HELLO, self.role, self.ship), self.host)
+            self.last_hello = now
+        if now - self.last_heard > TIMEOUT:
+            self.closed = True
+
+    def tick(self, state):
+        # Sends this tick's action state (ignored for spectators) with the last few before it,
+        # and acknowledges the newest state
+        if not self.connected:
+            return
+        rows = ()
+        if self.role == PLAYER:
+            self.sequence += 1
+            self.unacked.append((self.sequence, state))
+            if self.position is not None:
+                self.position = move_ship(*self.position, state, self.speed, self.dt, *self.bounds)
+            rows = list(self.unacked)[-INPUT_REDUNDANCY:]
+        packet = [_INPUT.pack(INPUT, self.latest, len(rows))]
+        packet.extend(_INPUT_ROW.pack(sequence, action_bits(state)) for sequence, state in rows)
+        self.send(b"".join(packet), self.host)
+
+    def view(self):
+        # (world, host time) to draw now, None before the first state
+        if not self.timeline:
+            return None
+        timeline = self.timeline
+        render_time = self.clock() + self.offset - INTERP_DELAY
+        newer = next((i for i, (elapsed, _) in enumerate(timeline) if elapsed >= render_time), None)
+        if newer is None:
+            # Nothing newer yet (late or lost states), hold the newest
+            self.held_frames += 1
+            elapsed, world = timeline[-1]
+            return interpolate(world, world, 1.0, render_time - elapsed), render_time
+        if newer == 0:
+            elapsed, world = timeline[0]
+            return interpolate(world, world, 1.0, 0.0), elapsed
+        (t0, older), (t1, world) = timeline[newer - 1], timeline[newer]
+        return interpolate(older, world, (render_time - t0) / (t1 - t0), render_time - t0), render_time
+
+    def stats(self):
+        stats = self.traffic()
+        intervals = sorted(self.intervals)
+        stats.update(
+            states=self.states_received, full_states=self.full_states, undecodable=self.undecodable,
+            state_interval_p50_ms=intervals[len(intervals) // 2] if intervals else 0.0,
+            state_interval_p95_ms=intervals[len(intervals) * 95 // 100] if intervals else 0.0,
+            held_frames=self.held_frames, corrections=self.corrections,
+            mean_correction_px=self.correction_px / self.corrections if self.corrections else 0.0)
+        return stats
+
+    def close(self):
+        if self.connected:
+            self.send(_KIND.pack(BYE), self.host)
+        super().close()
@@ -0,0 +1,136 @@
+import numpy as np
+import pygame
+
+
+# Explosion particles kept in NumPy arrays and updated in one vectorized step
+class ParticleSystem:
+    def __init__(self, capacity=2048, max_speed=480, radius_range=(2, 5), lifetime_range=(0.08, 0.17), seed=None):
+        self.max_speed = max_speed
+        self.radius_range = radius_range
+        self.lifetime_range = lifetime_range
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.colors = []
+        self.color_index = {}
+        self.sprites = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.prev_x = np.zeros(capacity)
+        self.prev_y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.lifetime = np.zeros(capacity)
+        self.radius = np.zeros(capacity, dtype=np.int16)
+        self.color = np.zeros(capacity, dtype=np.int16)
+
+    def _arrays(self):
+        return (self.x, self.y, self.prev_x, self.prev_y, self.vx, self.vy, self.lifetime, self.radius, self.color)
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        old = self._arrays()
+        self._allocate(capacity)
+        for new, arr in zip(self._arrays(), old):
+            new[:len(arr)] = arr
+
+    def __len__(self):
+        return self.count
+
+    def seed(self, seed):
+        self.rng = np.random.default_rng(seed)
+
+    def clear(self):
+        self.count = 0
+
+    def state(self):
+        # Copy of the live particles and the RNG, for snapshots
+        n = self.count
+        return [arr[:n].copy() for arr in self._arrays()], list(self.colors), self.rng.bit_generator.state
+
+    def load_state(self, state):
+        arrays, colors, rng_state = state
+        n = len(arrays[0])
+        if n > self.capacity:
+            self._grow(n)
+        for arr, saved in zip(self._arrays(), arrays):
+            arr[:n] = saved
+        self.count = n
+        self.colors = [tuple(color) for color in colors]
+        self.color_index = {color: i for i, color in enumerate(self.colors)}
+        self.rng.bit_generator.state = rng_state
+
+    def emit(self, x, y, color, count=10):
+        index = self.color_index.get(color)
+        if index is None:
+            index = self.color_index[color] = len(self.colors)
+            self.colors.append(color)
+        start = self.count
+        end = start + count
+        if end > self.capacity:
+            self._grow(end)
+        rng = self.rng
+        self.x[start:end] = x
+        self.y[start:end] = y
+        self.prev_x[start:end] = x
+        self.prev_y[start:end] = y
+        self.vx[start:end] = rng.uniform(-self.max_speed, self.max_speed, count)
+        self.vy[start:end] = rng.uniform(-self.max_speed, self.max_speed, count)
+        self.lifetime[start:end] = rng.uniform(self.lifetime_range[0], self.lifetime_range[1], count)
+        self.radius[start:end] = rng.integers(self.radius_range[0], self.radius_range[1] + 1, count)
+        self.color[start:end] = index
+        self.count = end
+
+    def update(self, dt):
+        n = self.count
+        if n == 0:
+            return
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+        self.x[:n] += self.vx[:n] * dt
+        self.y[:n] += self.vy[:n] * dt
+        lifetime = self.lifetime[:n]
+        lifetime -= dt
+        alive = lifetime > 0
+        live = int(np.count_nonzero(alive))
+        if live == n:
+            return
+        # Swap-remove compaction, same scheme as BulletPool
+        holes = np.flatnonzero(~alive[:live])
+        movers = np.flatnonzero(alive[live:]) + live
+        for arr in self._arrays():
+            arr[holes] = arr[movers]
+        self.count = live
+
+    def _sprite(self, color, radius):
+        # Keyed by RGB, not color index: loaded states may number their colors differently
+        rgb = self.colors[color]
+        key = (rgb, radius)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, rgb, (radius, radius), radius)
+            sprite = sprite.convert_alpha()
+            self.sprites[key] = sprite
+        return sprite
+
+    def draw(self, screen, alpha=1.0):
+        n = self.count
+        if n == 0:
+            return
+        x = (self.prev_x[:n] + (self.x[:n] - self.prev_x[:n]) * alpha).astype(np.int32)
+        y = (self.prev_y[:n] + (self.y[:n] - self.prev_y[:n]) * alpha).astype(np.int32)
+        radius = self.radius[:n]
+        # Group by sprite so consecutive blits share a source surface
+        key = self.color[:n].astype(np.int32) * 64 + radius
+        order = np.argsort(key, kind="stable")
+        x = (x - radius)[order].tolist()
+        y = (y - radius)[order].tolist()
+        keys = key[order].tolist()
+        sprites = {k: self._sprite(k // 64, k % 64) for k in set(keys)}
+        screen.blits([(sprites[k], (px, py)) for k, px, py in zip(keys, x, y)], False)
@@ -0,0 +1,85 @@
+# Free list of reusable entity instances, the entity class provides reset(*args)
+class Pool:
+    def __init__(self, cls):
+        self.cls = cls
+        self.free = []
+        self.created = 0
+
+    def acquire(self, *args):
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args)
+            return obj
+        self.created += 1
+        return self.cls(*args)
+
+    def release(self, obj):
+        self.free.append(obj)
+
+    def reserve(self, total, *args):
+        # Builds instances up front until total exist, so big waves do not allocate mid-game
+        while self.created < total:
+            self.created += 1
+            self.free.append(self.cls(*args))
+
+
+# Unordered container with O(1) swap-remove, entities remember their own slot. Each spawn also
+# gets a running uid, which tells entities apart across reused instances and moved slots.
+class EntityList:
+    def __init__(self, pool):
+        self.pool = pool
+        self.items = []
+        self.spawned = 0
+
+    def spawn(self, *args):
+        obj = self.pool.acquire(*args)
+        self.spawned += 1
+        obj.uid = self.spawned
+        obj.slot = len(self.items)
+        self.items.append(obj)
+        return obj
+
+    def spawn_many(self, rows):
+        # One entity per argument tuple, e.g. a whole formation
+        acquire = self.pool.acquire
+        items = self.items
+        for args in rows:
+            obj = acquire(*args)
+            self.spawned += 1
+            obj.uid = self.spawned
+            obj.slot = len(items)
+            items.append(obj)
+
+    def remove(self, obj):
+        items = self.items
+        i = obj.slot
+        last = items.pop()
+        if last is not obj:
+            items[i] = last
+            last.slot = i
+        obj.slot = -1
+        self.pool.release(obj)
+
+    def clear(self):
+        for obj in self.items:
+            obj.slot = -1
+            self.pool.release(obj)
+        self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def __reversed__(self):
+        # Safe while removing the current entity: swap-remove only pulls in entities already visited
+        items = self.items
+        i = len(items) - 1
+        while i >= 0:
+            if i < len(items):
+                yield items[i]
+            i -= 1
@@ -0,0 +1,82 @@
+import heapq
+import math
+
+import numpy as np
+
+
+def fire_pattern(angles=(0,), offsets=None):
+    # Precomputed x offsets (one per bullet) and angles for one shot
+    offsets = np.zeros(len(angles)) if offsets is None else np.array(offsets, dtype=float)
+    return offsets, tuple(angles)
+
+
+# Timed powerup effects. Each effect is a dict of data:
+#   duration      seconds the effect lasts, None for instant effects (e.g. "heal")
+#   stacking      "refresh" (default) restarts the timer on pickup, "extend" adds to the time left
+#   speed, bullet_speed   multipliers, the largest active one applies
+#   fire_rate     seconds between shots, the smallest active one applies
+#   fire_pattern  name in the patterns table; patterns are listed weakest first and the strongest active one wins
+#   big_bullets, shield   flags
+# Expiry times sit in a min-heap, so expire() only looks at the earliest one until something is due.
+class ActiveEffects:
+    def __init__(self, registry, patterns):
+        self.registry = registry
+        self.patterns = patterns
+        self.pattern_rank = {name: rank for rank, name in enumerate(patterns)}
+        self.expires = {}
+        # (expiry, name); entries replaced by a later pickup stay until they surface and are skipped
+        self.heap = []
+        self._derive()
+
+    def apply(self, name, now):
+        effect = self.registry[name]
+        duration = effect.get("duration")
+        if duration is None:
+            return effect
+        expiry = self.expires.get(name)
+        if expiry is not None and effect.get("stacking", "refresh") == "extend":
+            expiry += duration
+        else:
+            expiry = now + duration
+        self.expires[name] = expiry
+        heapq.heappush(self.heap, (expiry, name))
+        self._derive()
+        return effect
+
+    def expire(self, now):
+        heap = self.heap
+        if not heap or heap[0][0] >= now:
+            return False
+        changed = False
+        while heap and heap[0][0] < now:
+            expiry, name = heapq.heappop(heap)
+            if self.expires.get(name) == expiry:
+                del self.expires[name]
+                changed = True
+        if changed:
+            self._derive()
+        return changed
+
+    def __contains__(self, name):
+        return name in self.expires
+
+    def _derive(self):
+        # Combined modifiers of everything active, recomputed only when the set changes
+        effects = [self.registry[name] for name in self.expires]
+        self.speed = max([effect.get("speed", 1) for effect in effects], default=1)
+        self.bullet_speed = max([effect.get("bullet_speed", 1) for effect in effects], default=1)
+        self.fire_rate = min([effect.get("fire_rate", math.inf) for effect in effects], default=math.inf)
+        self.big_bullets = any(effect.get("big_bullets", False) for effect in effects)
+        self.shield = any(effect.get("shield", False) for effect in effects)
+        pattern = max((effect["fire_pattern"] for effect in effects if "fire_pattern" in effect),
+                      key=self.pattern_rank.get, default=next(iter(self.patterns)))
+        self.fire_pattern = self.patterns[pattern]
+
+    def state(self):
+        return dict(self.expires)
+
+    def load_state(self, state):
+        self.expires = dict(state)
+        self.heap = [(expiry, name) for name, expiry in self.expires.items()]
+        heapq.heapify(self.heap)
+        self._derive()
@@ -0,0 +1,166 @@
+import csv
+import json
+import time
+from collections import deque
+
+# Frames kept for the rolling percentiles
+PROFILE_WINDOW = 240
+
+
+def _percentile(sorted_samples, point):
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * point / 100))]
+
+
+# Lap timer: lap(name) charges the time since the previous lap to that phase.
+# end_frame() closes a frame and feeds the rolling per-frame windows used for percentiles;
+# with trace=True every lap is also kept for export as CSV or a Chrome trace.
+class PhaseTimer:
+    def __init__(self, clock=time.perf_counter, window=PROFILE_WINDOW, trace=False, max_trace_events=1000000):
+        self.clock = clock
+        self.window = window
+        self.totals = {}
+        self.counts = {}
+        self.frame = {}
+        self.history = {}
+        self.frame_history = deque(maxlen=window)
+        self.trace = [] if trace else None
+        self.max_trace_events = max_trace_events
+        self.start = clock()
+        self.last = self.start
+        self.frame_start = self.start
+
+    def begin(self):
+        self.last = self.frame_start = self.clock()
+
+    def lap(self, name):
+        now = self.clock()
+        elapsed = now - self.last
+        self.totals[name] = self.totals.get(name, 0.0) + elapsed
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.frame[name] = self.frame.get(name, 0.0) + elapsed
+        if self.trace is not None and len(self.trace) < self.max_trace_events:
+            self.trace.append((name, self.last, elapsed))
+        self.last = now
+
+    def mark(self, name):
+        # Instant event in the trace, e.g. the start of a session
+        if self.trace is not None and len(self.trace) < self.max_trace_events:
+            self.trace.append((name, self.clock(), None))
+
+    def end_frame(self):
+        for name, elapsed in self.frame.items():
+            samples = self.history.get(name)
+            if samples is None:
+                samples = self.history[name] = deque(maxlen=self.window)
+            samples.append(elapsed * 1000)
+        self.frame.clear()
+        self.frame_history.append((self.clock() - self.frame_start) * 1000)
+
+    def reset(self):
+        self.totals.clear()
+        self.counts.clear()
+        self.frame.clear()
+        self.history.clear()
+        self.frame_history.clear()
+        if self.trace is not None:
+            self.trace.clear()
+        self.last = self.frame_start = self.clock()
+
+    def percentiles(self, name=None, points=(50, 95, 99)):
+        # Milliseconds per frame over the rolling window; name=None is the whole frame
+        samples = sorted(self.frame_history if name is None else self.history.get(name, ()))
+        if not samples:
+            return {point: 0.0 for point in points}
+        return {point: _percentile(samples, point) for point in points}
+
+    def report(self):
+        # Milliseconds per phase: total, mean per lap and per-frame percentiles over the window
+        report = {}
+        for name, total in self.totals.items():
+            phase = {"total_ms": total * 1000, "mean_ms": total * 1000 / self.counts[name], "count": self.counts[name]}
+            for point, value in self.percentiles(name).items():
+                phase[f"p{point}_ms"] = value
+            report[name] = phase
+        return report
+
+    def export_chrome_trace(self, path):
+        # Loads in chrome://tracing and Perfetto
+        events = []
+        for name, start, elapsed in self.trace or ():
+            event = {"name": name, "pid": 0, "tid": 0, "ts": (start - self.start) * 1e6}
+            if elapsed is None:
+                event.update(ph="i", s="g")
+            else:
+                event.update(ph="X", dur=elapsed * 1e6)
+            events.append(event)
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def export_csv(self, path):
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["phase", "start_ms", "duration_ms"])
+            for name, start, elapsed in self.trace or ():
+                writer.writerow([name, f"{(start - self.start) * 1000:.4f}", "" if elapsed is None else f"{elapsed * 1000:.4f}"])
+
+    def export_trace(self, path):
+        if path.endswith(".csv"):
+            self.export_csv(path)
+        else:
+            self.export_chrome_trace(path)
+
+
+# Stand-in used when nobody is measuring
+class NullTimer:
+    def begin(self):
+        pass
+
+    def lap(self, name):
+        pass
+
+    def mark(self, name):
+        pass
+
+    def end_frame(self):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+# On-screen frame time breakdown; the text is re-rendered a few times a second, not every frame
+class ProfilerOverlay:
+    def __init__(self, font, interval=0.25, color=(0, 255, 0), background=(0, 0, 0)):
+        self.font = font
+        self.interval = interval
+        self.color = color
+        self.background = background
+        self.visible = False
+        self.lines = []
+        self.updated = 0.0
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.updated = 0.0
+
+    def _render(self, timer, fps, counts):
+        frame = timer.percentiles()
+        text = [f"FPS {fps:.0f}  frame p50 {frame[50]:.2f} p95 {frame[95]:.2f} p99 {frame[99]:.2f} ms"]
+        for name in timer.history:
+            phase = timer.percentiles(name)
+            text.append(f"{name:<10} {phase[50]:6.2f} {phase[95]:6.2f} {phase[99]:6.2f}")
+        text.append("  ".join(f"{name} {count}" for name, count in counts.items()))
+        self.lines = [self.font.render(line, True, self.color) for line in text]
+
+    def draw(self, screen, timer, fps, counts):
+        now = time.perf_counter()
+        if now - self.updated >= self.interval:
+            self._render(timer, fps, counts)
+            self.updated = now
+        if not self.lines:
+            return
+        line_height = self.lines[0].get_height()
+        width = max(line.get_width() for line in self.lines)
+        screen.fill(self.background, (0, 170, width + 8, line_height * len(self.lines) + 8))
+        for i, line in enumerate(self.lines):
+            screen.blit(line, (4, 174 + i * line_height))
@@ -0,0 +1,53 @@
+from operator import itemgetter
+
+# Draw layers, lowest first
+LAYER_BACKGROUND = 0
+LAYER_BULLETS = 1
+LAYER_ENEMIES = 2
+LAYER_ENEMY_LABELS = 3
+LAYER_PICKUPS = 4
+LAYER_PARTICLES = 5
+LAYER_PLAYER = 6
+LAYER_HUD = 7
+
+# Layers whose blits overlap by design (stacked parallax backdrops) keep their submission order
+ORDERED_LAYERS = frozenset((LAYER_BACKGROUND,))
+
+# (layer, texture, submission order); texture is 0 in ordered layers
+_sort_key = itemgetter(0, 1, 2)
+
+
+# Collects blits for a frame and submits them with one Surface.blits call
+class RenderQueue:
+    def __init__(self):
+        self.commands = []
+        self.submitted = 0
+        self.set_layer(LAYER_BACKGROUND)
+
+    def set_layer(self, layer):
+        self.layer = layer
+        self.ordered = layer in ORDERED_LAYERS
+
+    # Same call shape as Surface.blit/blits, so draw() methods can target the queue or a surface
+    def blit(self, surface, dest, area=None):
+        self.commands.append((self.layer, 0 if self.ordered else id(surface), len(self.commands), surface, dest, area))
+
+    def blits(self, sequence, doreturn=False):
+        commands = self.commands
+        layer = self.layer
+        ordered = self.ordered
+        for surface, dest in sequence:
+            commands.append((layer, 0 if ordered else id(surface), len(commands), surface, dest, None))
+
+    def __len__(self):
+        return len(self.commands)
+
+    def flush(self, target):
+        # Sorting by texture inside a layer keeps consecutive blits on the same source surface,
+        # except in ORDERED_LAYERS
+        commands = self.commands
+        commands.sort(key=_sort_key)
+        target.blits([(c[3], c[4], c[5]) for c in commands], False)
+        self.submitted = len(commands)
+        commands.clear()
+        self.set_layer(LAYER_BACKGROUND)
@@ -0,0 +1,158 @@
+# Input recording and deterministic re-simulation. A replay is the session seed and setup
+# plus every change in the sampled action state (controls.InputLayer), keyed by the tick it
+# was sampled for.
+#
+#     python replay.py data/last.replay              # re-simulate and check the recorded result
+#     python replay.py data/last.replay --seek 3000  # jump to a tick through snapshots
+import json
+import struct
+import zlib
+
+import pygame
+
+from controls import ACTION_EVENT
+
+REPLAY_MAGIC = b"SWREPLAY"
+REPLAY_VERSION = 2
+_HEADER = struct.Struct("<8sII")
+# (tick, action) per recorded input
+_EVENT = struct.Struct("<IB")
+
+# Action codes are the index in controls.ACTIONS, a release adds 16
+RELEASE_FLAG = 16
+PAUSE_ACTION = 255
+
+
+def encode_action(index, pressed):
+    return index | (0 if pressed else RELEASE_FLAG)
+
+
+def decode_action(action):
+    # ACTION_EVENT that re-applies a recorded change, None for markers like the pause
+    if action == PAUSE_ACTION:
+        return None
+    return pygame.event.Event(ACTION_EVENT, action=action & ~RELEASE_FLAG, pressed=not action & RELEASE_FLAG)
+
+
+class Replay:
+    def __init__(self, seed, setup=None):
+        self.seed = seed
+        # Whatever else the game needs to rebuild the session (mode, mission, ship)
+        self.setup = dict(setup or {})
+        self.actions = []
+        self.result = None
+
+    def record(self, tick, action):
+        self.actions.append((tick, action))
+
+    def input_source(self):
+        return ReplayInput(self)
+
+    def to_bytes(self):
+        header = json.dumps({"seed": self.seed, "setup": self.setup, "result": self.result}).encode()
+        body = b"".join(_EVENT.pack(tick, action) for tick, action in self.actions)
+        return _HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, len(header)) + header + zlib.compress(body)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, header_length = _HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"not a version {REPLAY_VERSION} replay")
+        start = _HEADER.size
+        header = json.loads(data[start:start + header_length])
+        replay = cls(header["seed"], header["setup"])
+        replay.result = header["result"]
+        body = zlib.decompress(data[start + header_length:])
+        replay.actions = list(_EVENT.iter_unpack(body))
+        return replay
+
+    def save(self, path):
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+
+# Input source for a headless session: events for the tick the session is about to run.
+# It keeps no position, so it stays correct after a session is restored from a snapshot.
+class ReplayInput:
+    def __init__(self, replay):
+        self.by_tick = {}
+        for tick, action in replay.actions:
+            event = decode_action(action)
+            if event is not None:
+                self.by_tick.setdefault(tick, []).append(event)
+
+    def __call__(self, tick):
+        return self.by_tick.get(tick, ())
+
+
+# Steps a headless session through a replay, snapshotting every snapshot_interval ticks so
+# seek() only re-simulates from the nearest earlier snapshot. end_tick stops runs that ended
+# without a result (quit or pause). The session needs frame(), snapshot(), restore(snapshot),
+# over, and timestep.ticks.
+class ReplayPlayer:
+    def __init__(self, session, snapshot_interval=600, end_tick=None):
+        self.session = session
+        self.snapshot_interval = snapshot_interval
+        self.end_tick = end_tick
+        self.snapshots = {session.timestep.ticks: session.snapshot()}
+
+    @property
+    def tick(self):
+        return self.session.timestep.ticks
+
+    def advance(self, ticks=None):
+        # Runs up to `ticks` further ticks, or to the end; returns False once the session is over
+        session = self.session
+        target = self.end_tick if ticks is None else session.timestep.ticks + ticks
+        while not session.over and (target is None or session.timestep.ticks < target):
+            session.frame()
+            tick = session.timestep.ticks
+            if tick % self.snapshot_interval == 0 and tick not in self.snapshots:
+                self.snapshots[tick] = session.snapshot()
+        return not session.over
+
+    def seek(self, tick):
+        current = self.tick
+        base = max(t for t in self.snapshots if t <= tick)
+        # Keep going from where we are if that is closer than the snapshot
+        if not base <= current <= tick:
+            self.session.restore(self.snapshots[base])
+        self.advance(tick - self.tick)
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import time
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import main
+    from engine import TICK_RATE
+
+    parser = argparse.ArgumentParser(description="Re-simulate a recorded run headlessly.")
+    parser.add_argument("path")
+    parser.add_argument("--seek", type=int, help="stop at this tick and print the state there")
+    args = parser.parse_args()
+
+    replay = Replay.load(args.path)
+    player = ReplayPlayer(main.replay_session(replay), end_tick=(replay.result or {}).get("ticks"))
+    start = time.perf_counter()
+    if args.seek is not None:
+        player.seek(args.seek)
+    else:
+        player.advance()
+    elapsed = time.perf_counter() - start
+    stats = player.session.stats(player.session.player_health <= 0)
+    speed = player.tick / TICK_RATE / elapsed if elapsed else 0.0
+    print(f"{player.tick} ticks in {elapsed:.2f}s ({speed:.0f}x real time)")
+    print("simulated:", stats)
+    if args.seek is None:
+        print("recorded: ", replay.result)
+        print("match" if stats == replay.result else "MISMATCH")
@@ -0,0 +1,134 @@
+# Binary save format for in-progress runs (GameSession.snapshot() plus the replay so far).
+# Structure is JSON, tuples are tagged so they come back as tuples; numpy arrays and bytes are
+# stored raw after it. No pickle, so snapshots sent in from players are safe to load.
+import json
+import os
+import queue
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+SAVE_MAGIC = b"SWSAVE\0\0"
+SAVE_VERSION = 1
+_HEADER = struct.Struct("<8sII")
+_BLOB = struct.Struct("<I")
+
+
+def _encode(value, blobs):
+    if isinstance(value, tuple):
+        return {"__tuple__": [_encode(item, blobs) for item in value]}
+    if isinstance(value, list):
+        return [_encode(item, blobs) for item in value]
+    if isinstance(value, dict):
+        return {key: _encode(item, blobs) for key, item in value.items()}
+    if isinstance(value, np.ndarray):
+        blobs.append(np.ascontiguousarray(value).tobytes())
+        return {"__array__": len(blobs) - 1, "dtype": value.dtype.str, "shape": list(value.shape)}
+    if isinstance(value, bytes):
+        blobs.append(value)
+        return {"__bytes__": len(blobs) - 1}
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _decode(value, blobs):
+    if isinstance(value, list):
+        return [_decode(item, blobs) for item in value]
+    if isinstance(value, dict):
+        if "__tuple__" in value:
+            return tuple(_decode(item, blobs) for item in value["__tuple__"])
+        if "__array__" in value:
+            return np.frombuffer(blobs[value["__array__"]], dtype=value["dtype"]).reshape(value["shape"]).copy()
+        if "__bytes__" in value:
+            return bytes(blobs[value["__bytes__"]])
+        return {key: _decode(item, blobs) for key, item in value.items()}
+    return value
+
+
+def to_bytes(state):
+    blobs = []
+    structure = json.dumps(_encode(state, blobs), separators=(",", ":")).encode()
+    body = [structure]
+    for blob in blobs:
+        body.append(_BLOB.pack(len(blob)))
+        body.append(blob)
+    # Level 1: saving runs every few seconds, speed matters more than the last few bytes
+    return _HEADER.pack(SAVE_MAGIC, SAVE_VERSION, len(structure)) + zlib.compress(b"".join(body), 1)
+
+
+def from_bytes(data):
+    magic, version, structure_length = _HEADER.unpack_from(data)
+    if magic != SAVE_MAGIC or version != SAVE_VERSION:
+        raise ValueError(f"not a version {SAVE_VERSION} save")
+    body = memoryview(zlib.decompress(data[_HEADER.size:]))
+    structure = json.loads(bytes(body[:structure_length]))
+    blobs = []
+    offset = structure_length
+    while offset < len(body):
+        (length,) = _BLOB.unpack_from(body, offset)
+        offset += _BLOB.size
+        blobs.append(body[offset:offset + length])
+        offset += length
+    return _decode(structure, blobs)
+
+
+def save(path, state):
+    # Written next to the target and swapped in, so a crash mid-write keeps the previous save
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(to_bytes(state))
+    os.replace(temp_path, path)
+
+
+def load(path):
+    # None when there is no usable save
+    try:
+        with open(path, "rb") as file:
+            return from_bytes(file.read())
+    except (OSError, ValueError, struct.error, zlib.error):
+        return None
+
+
+def delete(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Autosaves on a background thread: the game hands over a snapshot (cheap copies) and the
+# encoding, compression and file write happen here. A snapshot submitted while the previous one
+# is still being written replaces it in the queue rather than piling up behind it.
+class SaveWriter:
+    def __init__(self, path):
+        self.path = path
+        self.pending = queue.Queue(maxsize=1)
+        self.saves = 0
+        self.thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self.thread.start()
+
+    def submit(self, state):
+        try:
+            self.pending.get_nowait()
+            self.pending.task_done()
+        except queue.Empty:
+            pass
+        self.pending.put(state)
+
+    def _run(self):
+        while True:
+            state = self.pending.get()
+            try:
+                save(self.path, state)
+                self.saves += 1
+            except OSError as error:
+                print("Autosave failed:", error)
+            finally:
+                self.pending.task_done()
+
+    def flush(self):
+        # Blocks until the last submitted snapshot is on disk
+        self.pending.join()
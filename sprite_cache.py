@@ -0,0 +1,45 @@
+from collections import OrderedDict
+import pygame
+
+
+# Cache of scaled/rotated sprite variants keyed by (image, size, angle)
+class SpriteCache:
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self.pinned = {}
+        self.variants = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _build(self, image, size, angle):
+        surf = pygame.transform.scale(image, size) if size else image
+        if angle:
+            surf = pygame.transform.rotate(surf, angle)
+        return surf.convert_alpha()
+
+    def prewarm(self, name, image, sizes, angles):
+        # Known variants are pinned so arbitrary angles can never evict them
+        for size in sizes:
+            for angle in angles:
+                self.pinned[(name, size, angle % 360)] = self._build(image, size, angle)
+
+    def get(self, name, image, size=None, angle=0):
+        key = (name, size, angle % 360)
+        surf = self.pinned.get(key)
+        if surf is not None:
+            self.hits += 1
+            return surf
+        surf = self.variants.get(key)
+        if surf is not None:
+            self.variants.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        surf = self._build(image, size, angle)
+        self.variants[key] = surf
+        if len(self.variants) > self.max_size:
+            self.variants.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self.variants.clear()
@@ -0,0 +1,161 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+
+SCHEMA_VERSION = 2
+
+# Board holding the endless mode scores, missions use "mission<index>"
+ENDLESS_BOARD = "endless"
+
+
+def _create_tables(db):
+    db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    db.execute("CREATE TABLE leaderboard (name TEXT PRIMARY KEY, score INTEGER NOT NULL)")
+    db.execute("CREATE TABLE achievements (name TEXT PRIMARY KEY, unlocked INTEGER NOT NULL)")
+    db.execute("CREATE TABLE completed_missions (mission INTEGER PRIMARY KEY)")
+
+
+def _add_leaderboard_boards(db):
+    # Scores become per board; existing ones belong to the endless mode
+    db.execute("CREATE TABLE scores (board TEXT NOT NULL, name TEXT NOT NULL, score INTEGER NOT NULL, PRIMARY KEY (board, name))")
+    db.execute("INSERT INTO scores SELECT ?, name, score FROM leaderboard", (ENDLESS_BOARD,))
+    db.execute("DROP TABLE leaderboard")
+
+
+# Schema migrations, MIGRATIONS[n] upgrades a database from user_version n to n + 1
+MIGRATIONS = [_create_tables, _add_leaderboard_boards]
+
+
+def _read_legacy(legacy_dirs, filename):
+    for directory in legacy_dirs:
+        try:
+            with open(os.path.join(directory, filename), "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            continue
+    return None
+
+
+# SQLite save file with write-behind: the game thread updates its in-memory state and queues
+# writes, a background thread commits everything queued so far in one transaction
+class GameStore:
+    def __init__(self, path, legacy_dirs=()):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self._migrate(legacy_dirs)
+        self.writes = queue.Queue()
+        self.commits = 0
+        self.writer = threading.Thread(target=self._write_behind, name="store", daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def _migrate(self, legacy_dirs):
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"{self.path} has schema version {version}, this build supports {SCHEMA_VERSION}")
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            for migration in MIGRATIONS[version:]:
+                migration(self.db)
+                if migration is _create_tables:
+                    self._import_legacy(legacy_dirs)
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def _import_legacy(self, legacy_dirs):
+        # One-off import of the JSON files earlier versions of the game wrote
+        high_score = _read_legacy(legacy_dirs, "high_score.json")
+        if high_score is not None:
+            self.db.execute("INSERT INTO meta VALUES ('high_score', ?)", (str(int(high_score)),))
+        for name, score in (_read_legacy(legacy_dirs, "leaderboard.json") or {}).items():
+            self.db.execute("INSERT INTO leaderboard VALUES (?, ?)", (str(name), int(score)))
+        for name, unlocked in (_read_legacy(legacy_dirs, "achievements.json") or {}).items():
+            self.db.execute("INSERT INTO achievements VALUES (?, ?)", (name, int(bool(unlocked))))
+        for mission in _read_legacy(legacy_dirs, "completed_missions.json") or []:
+            self.db.execute("INSERT OR IGNORE INTO completed_missions VALUES (?)", (int(mission),))
+
+    # Reads, only used while loading
+
+    def high_score(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'high_score'").fetchone()
+        return int(row[0]) if row else 0
+
+    def leaderboards(self):
+        # {board: {name: score}}
+        boards = {}
+        for board, name, score in self.db.execute("SELECT board, name, score FROM scores"):
+            boards.setdefault(board, {})[name] = score
+        return boards
+
+    def bindings(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'bindings'").fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def achievements(self):
+        return {name: bool(unlocked) for name, unlocked in self.db.execute("SELECT name, unlocked FROM achievements")}
+
+    def completed_missions(self):
+        return {mission for (mission,) in self.db.execute("SELECT mission FROM completed_missions")}
+
+    # Writes, queued and committed by the background thread
+
+    def save_high_score(self, score):
+        self.writes.put(("INSERT OR REPLACE INTO meta VALUES ('high_score', ?)", (str(score),)))
+
+    def save_score(self, board, name, score):
+        # Keeps the best score per name
+        self.writes.put(("INSERT INTO scores VALUES (?, ?, ?) ON CONFLICT(board, name) DO UPDATE SET score = max(score, excluded.score)",
+                         (board, name, score)))
+
+    def save_bindings(self, bindings):
+        self.writes.put(("INSERT OR REPLACE INTO meta VALUES ('bindings', ?)", (json.dumps(bindings),)))
+
+    def save_achievements(self, achievements):
+        for name, unlocked in achievements.items():
+            self.writes.put(("INSERT OR REPLACE INTO achievements VALUES (?, ?)", (name, int(unlocked))))
+
+    def save_completed_mission(self, mission):
+        self.writes.put(("INSERT OR IGNORE INTO completed_missions VALUES (?)", (mission,)))
+
+    def _write_behind(self):
+        while True:
+            batch = [self.writes.get()]
+            while True:
+                try:
+                    batch.append(self.writes.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            statements = [write for write in batch if write is not None]
+            if statements:
+                self.db.execute("BEGIN")
+                try:
+                    for sql, params in statements:
+                        self.db.execute(sql, params)
+                    self.db.execute("COMMIT")
+                    self.commits += 1
+                except sqlite3.Error as error:
+                    self.db.execute("ROLLBACK")
+                    print("Saving failed:", error)
+            for _ in batch:
+                self.writes.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        # Blocks until everything queued so far is committed
+        self.writes.join()
+
+    def close(self):
+        if self.writer.is_alive():
+            self.writes.put(None)
+            self.writer.join()
+            self.db.close()
@@ -0,0 +1,51 @@
+from collections import OrderedDict
+
+
+# Memoizes font.render results keyed by (font, text, color)
+class TextCache:
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, color, antialias)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        surf = font.render(text, antialias, color)
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.surfaces), "hit_rate": self.hit_rate()}
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+# HUD label that only re-renders when its value changes
+class CachedText:
+    def __init__(self, cache, font, template, color=(255, 255, 255)):
+        self.cache = cache
+        self.font = font
+        self.template = template
+        self.color = color
+        self.value = None
+        self.surface = None
+
+    def render(self, *value):
+        if value != self.value or self.surface is None:
+            self.value = value
+            self.surface = self.cache.render(self.font, self.template.format(*value), self.color)
+        return self.surface
@@ -0,0 +1,244 @@
+import pygame
+
+# Frame cap used while a menu has something animating
+UI_FPS = 30
+# How often an idle menu wakes up for UILayer.pollers, in ms
+POLL_INTERVAL = 250
+
+
+# Retained-mode menu layer that repaints and pushes only the regions that changed
+class UILayer:
+    # Callables run on every events() call of every menu, for work that must go on behind the menus
+    # (e.g. answering net clients)
+    pollers = []
+
+    def __init__(self, screen, background, fps=UI_FPS):
+        self.screen = screen
+        self.background = background
+        self.fps = fps
+        self.clock = pygame.time.Clock()
+        self.widgets = []
+        self.states = []
+        self.bounds = []
+        self.dirty = []
+        self.full_redraw = True
+
+    def add(self, widget):
+        self.widgets.append(widget)
+        self.states.append(None)
+        self.bounds.append(None)
+        return widget
+
+    def invalidate(self, rect=None):
+        if rect is None:
+            self.full_redraw = True
+        else:
+            self.dirty.append(pygame.Rect(rect))
+
+    def _collect(self):
+        # Widgets expose ui_state(); any change dirties both the old and the new bounds
+        for i, widget in enumerate(self.widgets):
+            state = (getattr(widget, "visible", True), widget.ui_state())
+            if state != self.states[i]:
+                old = self.bounds[i]
+                self.states[i] = state
+                self.bounds[i] = widget.bounds()
+                if old is not None and old != self.bounds[i]:
+                    self.dirty.append(old)
+                self.dirty.append(self.bounds[i])
+
+    def _paint(self, clip):
+        screen = self.screen
+        screen.set_clip(clip)
+        if clip is None:
+            screen.blit(self.background, (0, 0))
+        else:
+            screen.blit(self.background, clip, clip)
+        for i, widget in enumerate(self.widgets):
+            if getattr(widget, "visible", True) and (clip is None or clip.colliderect(self.bounds[i])):
+                widget.draw(screen)
+        screen.set_clip(None)
+
+    def refresh(self):
+        self._collect()
+        if self.full_redraw:
+            self._paint(None)
+            pygame.display.update()
+            self.full_redraw = False
+        elif self.dirty:
+            rects = self.dirty[0].unionall(self.dirty[1:]) if len(self.dirty) > 8 else None
+            rects = [rects] if rects else self.dirty
+            for rect in rects:
+                self._paint(rect)
+            pygame.display.update(rects)
+        self.dirty = []
+
+    def hover(self, mouse_pos):
+        for widget in self.widgets:
+            if getattr(widget, "visible", True) and hasattr(widget, "check_hover"):
+                widget.check_hover(mouse_pos)
+
+    def animating(self):
+        return any(getattr(w, "animating", False) and getattr(w, "visible", True) for w in self.widgets)
+
+    def events(self):
+        # Block in the event queue when idle (up to POLL_INTERVAL with pollers), otherwise tick at the UI frame cap
+        for poll in self.pollers:
+            poll()
+        if self.animating():
+            self.clock.tick(self.fps)
+            return pygame.event.get()
+        events = [pygame.event.wait(POLL_INTERVAL) if self.pollers else pygame.event.wait()]
+        events.extend(pygame.event.get())
+        return events
+
+
+
+# Pre-rendered button faces (rounded box plus caption) packed into shared atlas pages with a shelf
+# packer, so a button draws with one blit from its page. Faces are keyed by everything that changes
+# the pixels; when max_pages fill up the atlas starts over and faces are rendered again on demand.
+class ButtonAtlas:
+    def __init__(self, font, cache, page_size=(1024, 512), max_pages=4, radius=10, padding=2):
+        self.font = font
+        self.cache = cache
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.radius = radius
+        self.padding = padding
+        self.faces = {}
+        self.pages = []
+        self.shelf_x = self.shelf_y = self.shelf_height = 0
+        self.renders = 0
+
+    def _new_page(self, width, height):
+        if len(self.pages) >= self.max_pages:
+            self.faces.clear()
+            self.pages.clear()
+        page_width, page_height = self.page_size
+        self.pages.append(pygame.Surface((max(width, page_width), max(height, page_height)), pygame.SRCALPHA).convert_alpha())
+        self.shelf_x = self.shelf_y = self.shelf_height = 0
+
+    def _allocate(self, width, height):
+        if not self.pages:
+            self._new_page(width, height)
+        page = self.pages[-1]
+        if self.shelf_x + width > page.get_width():
+            self.shelf_x = 0
+            self.shelf_y += self.shelf_height
+            self.shelf_height = 0
+        if self.shelf_y + height > page.get_height():
+            self._new_page(width, height)
+            page = self.pages[-1]
+        area = pygame.Rect(self.shelf_x, self.shelf_y, width, height)
+        self.shelf_x += width + self.padding
+        self.shelf_height = max(self.shelf_height, height + self.padding)
+        return page, area
+
+    def face(self, text, size, color, text_color):
+        # (page, area): the face, centred on the button when drawn
+        key = (text, size, color, text_color)
+        face = self.faces.get(key)
+        if face is None:
+            caption = self.cache.render(self.font, text, text_color)
+            width = max(size[0], caption.get_width())
+            height = max(size[1], caption.get_height())
+            page, area = self._allocate(width, height)
+            box = pygame.Rect(0, 0, *size)
+            box.center = area.center
+            page.fill((0, 0, 0, 0), area)
+            pygame.draw.rect(page, color, box, border_radius=self.radius)
+            page.blit(caption, caption.get_rect(center=area.center))
+            face = self.faces[key] = (page, area)
+            self.renders += 1
+        return face
+
+# Static or changing line of text
+class Label:
+    def __init__(self, cache, font, text, pos, color=(255, 255, 255), center=False):
+        self.cache = cache
+        self.font = font
+        self.text = text
+        self.pos = pos
+        self.color = color
+        self.center = center
+        self.visible = True
+
+    def _surface(self):
+        return self.cache.render(self.font, self.text, self.color)
+
+    def _topleft(self, surf):
+        x, y = self.pos
+        return (x - surf.get_width() // 2, y) if self.center else (x, y)
+
+    def ui_state(self):
+        return self.text, self.color
+
+    def bounds(self):
+        surf = self._surface()
+        return surf.get_rect(topleft=self._topleft(surf))
+
+    def draw(self, screen):
+        surf = self._surface()
+        screen.blit(surf, self._topleft(surf))
+
+
+class Image:
+    def __init__(self, image, pos):
+        self.image = image
+        self.pos = pos
+        self.visible = True
+
+    def ui_state(self):
+        return self.pos
+
+    def bounds(self):
+        return self.image.get_rect(topleft=self.pos)
+
+    def draw(self, screen):
+        screen.blit(self.image, self.pos)
+
+
+# Horizontal slider driven by mouse events
+class Slider:
+    def __init__(self, x, y, value, min_value, max_value, width=200, height=10, handle_radius=10):
+        self.x = x
+        self.y = y
+        self.value = value
+        self.min_value = min_value
+        self.max_value = max_value
+        self.width = width
+        self.height = height
+        self.handle_radius = handle_radius
+        self.rect = pygame.Rect(x, y, width, height)
+        self.visible = True
+
+    def handle_event(self, event):
+        # Returns True when the value moved
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            pressed = True
+        elif event.type == pygame.MOUSEMOTION:
+            pressed = event.buttons[0] == 1
+        else:
+            return False
+        if not pressed or not self.rect.collidepoint(event.pos):
+            return False
+        value = self.min_value + (event.pos[0] - self.x) / self.width * (self.max_value - self.min_value)
+        value = max(self.min_value, min(self.max_value, value))
+        if value == self.value:
+            return False
+        self.value = value
+        return True
+
+    def _handle_x(self):
+        return self.x + int((self.value - self.min_value) / (self.max_value - self.min_value) * self.width)
+
+    def ui_state(self):
+        return self._handle_x()
+
+    def bounds(self):
+        r = self.handle_radius
+        return pygame.Rect(self.x - r, self.y + self.height // 2 - r, self.width + r * 2 + 1, r * 2 + 1)
+
+    def draw(self, screen):
+        pygame.draw.rect(screen, (200, 200, 200), self.rect, border_radius=5)
+        pygame.draw.circle(screen, (0, 128, 255), (self._handle_x(), self.y + self.height // 2), self.handle_radius)
@@ -0,0 +1,106 @@
+import math
+
+# What each enemy type costs against the wave budget
+ENEMY_COSTS = {"fast": 1, "shooter": 2, "tank": 3}
+
+# Enemy formations as (dx, dy, type) per enemy: dx from the formation's left edge, dy how far
+# above the spawn line. A formation joins the rotation min_time seconds into the run.
+FORMATIONS = {
+    "scout": {"min_time": 0, "enemies": [(0, 0, "fast")]},
+    "gunner": {"min_time": 0, "enemies": [(0, 0, "shooter")]},
+    "pair": {"min_time": 5, "enemies": [(0, 0, "fast"), (80, 0, "fast")]},
+    "brute": {"min_time": 10, "enemies": [(0, 0, "tank")]},
+    "vee": {"min_time": 15, "enemies": [(0, 80, "fast"), (60, 40, "fast"), (120, 0, "shooter"), (180, 40, "fast"), (240, 80, "fast")]},
+    "line": {"min_time": 30, "enemies": [(i * 70, 0, "fast") for i in range(6)]},
+    "column": {"min_time": 45, "enemies": [(0, i * 90, "shooter") for i in range(4)]},
+    "wall": {"min_time": 60, "enemies": [(i * 100, 0, "tank") for i in range(5)]},
+}
+
+
+# Decides what enters the screen and when. Enemies are bought from a budget that fills at a rate
+# growing with time survived; the next formation is picked once per wave (not rolled every tick)
+# from tables built up front, and spawns as a single batch. Powerups and meteors arrive as
+# Poisson processes, each next arrival drawn when the previous one is due.
+#
+# Config (all rates per second):
+#   budget_rate, budget_growth, max_budget_rate   budget income: rate * (1 + growth * t), capped
+#   max_enemies        concurrent enemy cap, a wave waits until it fits
+#   health, health_growth                          enemy health: health * (1 + growth * t)
+#   formations         names from FORMATIONS to use, empty for no enemy waves
+#   powerup_rate, max_powerups, meteor_rate, max_meteors
+class WaveDirector:
+    def __init__(self, config, rng, width, colors, spawn_y=-50):
+        self.config = config
+        self.rng = rng
+        self.width = width
+        self.colors = colors
+        self.spawn_y = spawn_y
+        # Spawn tables: per formation its cost, width and rows, sorted by unlock time
+        self.tables = []
+        for name in sorted(config["formations"], key=lambda name: FORMATIONS[name]["min_time"]):
+            formation = FORMATIONS[name]
+            rows = [(dx, spawn_y - dy, type) for dx, dy, type in formation["enemies"]]
+            cost = sum(ENEMY_COSTS[type] for _, _, type in rows)
+            self.tables.append((formation["min_time"], name, cost, max(dx for dx, _, _ in rows), rows))
+        self.by_name = {table[1]: table for table in self.tables}
+        self.unlock_times = [table[0] for table in self.tables]
+        # Unspent budget is capped so a quiet spell cannot pile up into one huge wave
+        self.max_budget = max([table[2] for table in self.tables], default=0) * 2
+        self.budget = 0.0
+        self.next_wave = None
+        self.next_powerup = self._after(0, config["powerup_rate"])
+        self.next_meteor = self._after(0, config["meteor_rate"])
+
+    def _after(self, now, rate):
+        return now + self.rng.expovariate(rate) if rate > 0 else math.inf
+
+    def budget_rate(self, now):
+        config = self.config
+        return min(config["max_budget_rate"], config["budget_rate"] * (1 + config["budget_growth"] * now))
+
+    def enemy_health(self, now):
+        return max(1, round(self.config["health"] * (1 + self.config["health_growth"] * now)))
+
+    def _plan(self, now):
+        unlocked = sum(1 for time in self.unlock_times if time <= now)
+        if not unlocked:
+            return None
+        return self.tables[self.rng.randrange(unlocked)][1]
+
+    def enemies(self, now, dt, alive):
+        # (x, y, health, color, type) rows to spawn this tick, usually none
+        if not self.tables:
+            return ()
+        self.budget = min(self.max_budget, self.budget + self.budget_rate(now) * dt)
+        if self.next_wave is None:
+            self.next_wave = self._plan(now)
+            if self.next_wave is None:
+                return ()
+        _, _, cost, span, rows = self.by_name[self.next_wave]
+        if self.budget < cost or alive + len(rows) > self.config["max_enemies"]:
+            return ()
+        self.budget -= cost
+        self.next_wave = None
+        rng = self.rng
+        x = rng.randint(0, max(0, self.width - 60 - span))
+        health = self.enemy_health(now)
+        color = rng.choice(self.colors)
+        return [(x + dx, y, health, color, type) for dx, y, type in rows]
+
+    def powerup_due(self, now, alive):
+        if now < self.next_powerup:
+            return False
+        self.next_powerup = self._after(now, self.config["powerup_rate"])
+        return alive < self.config["max_powerups"]
+
+    def meteor_due(self, now, alive):
+        if now < self.next_meteor:
+            return False
+        self.next_meteor = self._after(now, self.config["meteor_rate"])
+        return alive < self.config["max_meteors"]
+
+    def state(self):
+        return self.budget, self.next_wave, self.next_powerup, self.next_meteor
+
+    def load_state(self, state):
+        self.budget, self.next_wave, self.next_powerup, self.next_meteor = state